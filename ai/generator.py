@@ -1,8 +1,13 @@
-import os, io, json, random, base64, time, logging
-from typing import Dict, Any, List, Optional
+import os, re, json, random, base64, time, logging, tempfile, itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, IO, Tuple, Iterable
 import requests
+from django.conf import settings
 from PIL import Image
 
+from . import traffic
+from .procedural import generate_local_concept, render_local_image
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,10 +22,33 @@ TEXT_MODELS = [
 ]
 IMG_MODEL = os.environ.get("HF_IMG_MODEL", "stabilityai/stable-diffusion-2-1")
 
+
 API_BASE = "https://api-inference.huggingface.co/models"
 
 HEADERS = {"Authorization": f"Bearer {HF_TOKEN}"} if HF_TOKEN else {}
 
+# Ingestion des images : lecture par blocs, formats conservés tels quels
+IMG_CHUNK_SIZE = 64 * 1024
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+# Début de la chaîne base64 dans une réponse JSON : {"image": "...", "images": ["..."]}
+B64_KEY_RE = re.compile(rb'"(?:image|generated_image|images)"\s*:\s*\[?\s*"')
+# Échappements JSON et blancs tolérés au milieu du base64
+B64_NOISE_RE = re.compile(rb"\\[nrt]|\s")
+# Pool borné : limite le nombre de décodages PIL simultanés (et donc la RAM)
+_transcode_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("IMG_TRANSCODE_WORKERS", "2")),
+    thread_name_prefix="img-transcode",
+)
+
+def _local_only() -> bool:
+    """GENERATION_MODE="local" : mode dégradé, générateur procédural uniquement.
+    Lu dans les réglages Django, ou l'environnement si Django n'est pas configuré."""
+    if settings.configured:
+        mode = getattr(settings, "GENERATION_MODE", "remote")
+    else:
+        mode = os.environ.get("GENERATION_MODE", "remote")
+    return mode == "local"
+
 def _hf_post(model: str, payload: Dict[str, Any], stream: bool = False, max_retries: int = 3):
     """Fonction robuste pour interagir avec l'API Hugging Face"""
     url = f"{API_BASE}/{model}"
@@ -28,6 +56,7 @@ def _hf_post(model: str, payload: Dict[str, Any], stream: bool = False, max_retr
     for attempt in range(max_retries):
         try:
             logger.info(f"Tentative {attempt+1} avec le modèle: {model}")
+            traffic.count_attempt()
             resp = requests.post(url, headers=HEADERS, json=payload, stream=stream, timeout=120)
             
             # Gestion des erreurs spécifiques
@@ -73,8 +102,10 @@ def _hf_post(model: str, payload: Dict[str, Any], stream: bool = False, max_retr
     
     raise Exception(f"Échec après {max_retries} tentatives avec le modèle {model}")
 
-def generate_with_fallback(prompt: str, max_tokens: int = 800) -> str:
-    """Tente de générer du texte avec plusieurs modèles en cascade"""
+def generate_with_fallback(prompt: str, max_tokens: int = 800, context: Optional[Dict[str, str]] = None,
+                           local_fallback: bool = True) -> str:
+    """Tente de générer du texte avec plusieurs modèles en cascade.
+    Sans `local_fallback`, l'échec de tous les modèles lève une exception."""
     for model in TEXT_MODELS:
         try:
             payload = {
@@ -91,6 +122,7 @@ def generate_with_fallback(prompt: str, max_tokens: int = 800) -> str:
             
             resp = _hf_post(model, payload)
             data = resp.json()
+            traffic.annotate(text_model=model)
             
             # Extraction du texte généré selon différents formats de réponse
             if isinstance(data, list) and data:
@@ -118,51 +150,33 @@ def generate_with_fallback(prompt: str, max_tokens: int = 800) -> str:
             logger.error(f"Échec avec {model}: {e}")
             continue
     
+    if not local_fallback:
+        raise RuntimeError("Tous les modèles ont échoué")
     # Fallback manuel si tous les modèles échouent
     logger.error("Tous les modèles ont échoué, utilisation du fallback manuel")
-    return fallback_manual_response()
-
-def fallback_manual_response() -> str:
-    """Génère une réponse manuelle si tous les modèles échouent"""
-    return json.dumps({
-        "universe": "Un univers fantastique où la magie et la technologie coexistent.",
-        "scenario": {
-            "act1": "Le héros découvre ses pouvoirs et se lance dans l'aventure.",
-            "act2": "Affrontement avec les forces antagonistes et découvertes de trahisons.",
-            "act3": "Résolution finale et confrontation avec le grand méchant."
-        },
-        "twist": "Le mentor du héros est en réalité le véritable antagoniste.",
-        "characters": [
-            {
-                "name": "Aelryn",
-                "class": "Mage",
-                "role": "Protagoniste",
-                "background": "Jeune apprenti découvrant ses pouvoirs exceptionnels",
-                "gameplay": "Magie offensive et défensive avec invocations"
-            },
-            {
-                "name": "Kaelen",
-                "class": "Guerrier",
-                "role": "Compagnon",
-                "background": "Soldat vétéran cherchant la rédemption",
-                "gameplay": "Combat au corps à corps avec différentes armes"
-            }
-        ],
-        "locations": [
-            {
-                "name": "Cité Céleste",
-                "description": "Une ville flottante où la magie est source d'énergie"
-            },
-            {
-                "name": "Forêt des Anciens",
-                "description": "Une forêt primitive habitée par des créatures mystiques"
-            }
-        ],
-        "pitch": "Plongez dans une aventure épique où vos choix façonnent le destin du monde. Une expérience de jeu unique mêlant exploration, combat tactique et narration riche."
-    }, ensure_ascii=False)
+    traffic.annotate(text_model="local")
+    return fallback_manual_response(context)
+
+def fallback_manual_response(context: Optional[Dict[str, str]] = None) -> str:
+    """Génère une réponse locale (procédurale) si tous les modèles échouent"""
+    return json.dumps(generate_local_concept(**(context or {})), ensure_ascii=False)
 
 # --------- Génération TEXTE ---------
-def generate_structured_game(title: str, genre: str, ambiance: str, keywords: str, references: str) -> Dict[str, Any]:
+def _json_block(text: str) -> str:
+    """Extrait le bloc {...} le plus large du texte (ou le texte entier)."""
+    start_idx = text.find('{')
+    end_idx = text.rfind('}')
+    if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
+        return text[start_idx:end_idx+1]
+    return text
+
+def generate_structured_game(title: str, genre: str, ambiance: str, keywords: str, references: str,
+                             draft: bool = False) -> Dict[str, Any]:
+    context = {"title": title, "genre": genre, "ambiance": ambiance, "keywords": keywords, "references": references}
+    if draft or _local_only():
+        traffic.annotate(text_model="local")
+        return generate_local_concept(**context)
+
     prompt = f"""
 Tu es un assistant de Game Design. Génère STRICTEMENT un JSON valide en français décrivant un concept de jeu vidéo.
 
@@ -185,19 +199,11 @@ references="{references}"
 """
 
     try:
-        text = generate_with_fallback(prompt)
+        text = generate_with_fallback(prompt, context=context)
         
         # Nettoyage et extraction du JSON
         text = text.strip().strip("`")  # Retirer les backticks Markdown
-        
-        # Chercher un bloc JSON
-        start_idx = text.find('{')
-        end_idx = text.rfind('}')
-        
-        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-            json_str = text[start_idx:end_idx+1]
-        else:
-            json_str = text
+        json_str = _json_block(text)
             
         # Essayer de parser le JSON
         try:
@@ -205,75 +211,267 @@ references="{references}"
             return parsed
         except json.JSONDecodeError as e:
             logger.warning(f"Erreur de parsing JSON: {e}, texte reçu: {text}")
-            # Si le parsing échoue, retourner une structure de base avec le texte brut
-            return {
-                "universe": "Univers généré par IA",
-                "scenario": {
-                    "act1": "Premier acte du scénario",
-                    "act2": "Deuxième acte du scénario", 
-                    "act3": "Troisième acte du scénario"
-                },
-                "twist": "Une twist narrative intéressante",
-                "characters": [
-                    {
-                        "name": "Personnage Principal",
-                        "class": "Classe par défaut",
-                        "role": "Rôle dans l'histoire",
-                        "background": "Histoire du personnage",
-                        "gameplay": "Style de gameplay"
-                    }
-                ],
-                "locations": [
-                    {
-                        "name": "Lieu emblématique",
-                        "description": "Description du lieu"
-                    }
-                ],
-                "pitch": "Un jeu passionnant qui va révolutionner le genre",
-                "raw_text": text  # Inclure le texte original pour débogage
-            }
+            # Si le parsing échoue, retourner un concept local avec le texte brut
+            parsed = generate_local_concept(**context)
+            parsed["raw_text"] = text  # Inclure le texte original pour débogage
+            return parsed
             
     except Exception as e:
         logger.error(f"Erreur critique dans generate_structured_game: {e}")
         # Fallback ultime en cas d'échec complet
-        return fallback_manual_response()
+        return generate_local_concept(**context)
+
+# --------- Régénération d'une section ---------
+# section -> (consigne, type attendu, max_new_tokens)
+SECTIONS = {
+    "universe": ("description courte (3-5 lignes)", str, 200),
+    "scenario": ('objet avec "act1", "act2", "act3" (2-4 lignes chacun)', dict, 400),
+    "scenario.act1": ("premier acte, 2-4 lignes", str, 150),
+    "scenario.act2": ("deuxième acte, 2-4 lignes", str, 150),
+    "scenario.act3": ("troisième acte, 2-4 lignes", str, 150),
+    "twist": ("une phrase", str, 80),
+    "characters": ('liste 2 à 4 personnages {"name","class","role","background","gameplay"}', list, 450),
+    "locations": ('liste 2 à 3 lieux {"name","description"}', list, 250),
+    "pitch": ("2-3 phrases marketing", str, 150),
+}
+# Clés obligatoires (chaînes non vides) des sections structurées
+SECTION_KEYS = {
+    "scenario": ("act1", "act2", "act3"),
+    "characters": ("name", "class", "role", "background", "gameplay"),
+    "locations": ("name", "description"),
+}
+
+def _filled(value: Any) -> bool:
+    return isinstance(value, str) and bool(value.strip())
+
+def valid_section(section: str, value: Any) -> bool:
+    """Vérifie qu'une valeur a la forme attendue par la section avant fusion."""
+    _, expected, _ = SECTIONS[section]
+    if not isinstance(value, expected) or not value:
+        return False
+    keys = SECTION_KEYS.get(section, ())
+    if expected is str:
+        return _filled(value)
+    if expected is dict:
+        return all(_filled(value.get(k)) for k in keys)
+    return all(isinstance(item, dict) and all(_filled(item.get(k)) for k in keys) for item in value)
+
+def _existing_names(generated: Optional[Dict[str, Any]], section: str) -> List[str]:
+    items = (generated or {}).get(section)
+    if not isinstance(items, list):
+        return []
+    return [item["name"] for item in items if isinstance(item, dict) and _filled(item.get("name"))]
+
+def get_section(generated: Dict[str, Any], section: str) -> Any:
+    value = generated
+    for part in section.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def merge_section(generated: Optional[Dict[str, Any]], section: str, value: Any) -> Dict[str, Any]:
+    """Retourne une copie de `generated` où seule la section donnée est remplacée."""
+    merged = dict(generated or {})
+    parent, *rest = section.split(".")
+    if rest:
+        sub = merged.get(parent)
+        merged[parent] = {**(sub if isinstance(sub, dict) else {}), rest[0]: value}
+    else:
+        merged[parent] = value
+    return merged
+
+def regenerate_section(title: str, genre: str, ambiance: str, keywords: str, references: str,
+                       generated: Optional[Dict[str, Any]], section: str, draft: bool = False) -> Any:
+    """
+    Régénère une seule section du concept (ex: "characters", "scenario.act2").
+    Le prompt ne contient que le concept existant, compacté, et la consigne de
+    la section : entrée et sortie bien plus courtes qu'une génération complète.
+    """
+    if section not in SECTIONS:
+        raise ValueError(f"Section inconnue: {section}")
+    instruction, expected, max_tokens = SECTIONS[section]
+    context = {"title": title, "genre": genre, "ambiance": ambiance, "keywords": keywords, "references": references}
+    # Repli local ancré sur les personnages et lieux déjà présents dans le concept,
+    # sauf ceux de la section régénérée (qui doit justement en changer)
+    names = [] if section == "characters" else _existing_names(generated, "characters")
+    places = [] if section == "locations" else _existing_names(generated, "locations")
+
+    def local_value():
+        traffic.annotate(text_model="local")
+        return get_section(generate_local_concept(**context, names=names, places=places), section)
+
+    if draft or _local_only():
+        return local_value()
+
+    existing = {k: v for k, v in (generated or {}).items() if k != "raw_text"}
+    existing = merge_section(existing, section, None)
+    key = section.split(".")[-1]
+    prompt = f"""
+Tu es un assistant de Game Design. Concept existant du jeu "{title}" ({genre}, {ambiance}) :
+{json.dumps(existing, ensure_ascii=False, separators=(",", ":"))}
+
+Régénère UNIQUEMENT le champ "{section}" : {instruction}. Reste cohérent avec le concept.
+Réponds STRICTEMENT en JSON valide, en français : {{"{key}": ...}}. Pas de texte hors JSON.
+"""
+
+    try:
+        text = generate_with_fallback(prompt, max_tokens=max_tokens, local_fallback=False).strip().strip("`")
+        try:
+            parsed = json.loads(_json_block(text))
+            value = parsed.get(key) if isinstance(parsed, dict) else parsed
+        except json.JSONDecodeError:
+            # Une section texte peut être renvoyée sans enveloppe JSON
+            value = text if expected is str else None
+        if valid_section(section, value):
+            return value
+        logger.warning(f"Section {section} invalide, texte reçu: {text}")
+    except Exception as e:
+        logger.error(f"Erreur dans regenerate_section({section}): {e}")
+    return local_value()
 
 # --------- Génération IMAGE ---------
-def generate_concept_image(prompt: str) -> Image.Image:
+def _spool_response(resp) -> IO[bytes]:
+    """Copie le corps de la réponse dans un fichier temporaire, bloc par bloc."""
+    tmp = tempfile.TemporaryFile()
+    for chunk in resp.iter_content(chunk_size=IMG_CHUNK_SIZE):
+        if chunk:
+            tmp.write(chunk)
+    tmp.seek(0)
+    return tmp
+
+def _spool_base64_json(chunks: Iterable[bytes]) -> Optional[IO[bytes]]:
     """
-    Retourne une PIL.Image à partir d'un prompt. Gère image/png ou base64.
+    Décode au fil du flux la première image base64 d'une réponse JSON vers un
+    fichier temporaire : ni le JSON ni la chaîne base64 ne sont chargés en
+    entier. Retourne None si aucune clé image n'est trouvée.
     """
+    chunks = iter(chunks)
+    buf = b""
+    for chunk in chunks:
+        buf += chunk
+        match = B64_KEY_RE.search(buf)
+        if match:
+            buf = buf[match.end():]
+            break
+        buf = buf[-64:]  # une clé peut être à cheval sur deux blocs
+    else:
+        return None
+
+    tmp = tempfile.TemporaryFile()
+    rest = b""
+    try:
+        for chunk in itertools.chain([buf], chunks):
+            end = chunk.find(b'"')
+            data = rest + (chunk if end == -1 else chunk[:end])
+            hold = b""
+            if end == -1 and data.endswith(b"\\"):  # échappement coupé entre deux blocs
+                data, hold = data[:-1], b"\\"
+            data = B64_NOISE_RE.sub(b"", data.replace(b"\\/", b"/"))
+            usable = len(data) - len(data) % 4
+            tmp.write(base64.b64decode(data[:usable]))
+            rest = data[usable:] + hold
+            if end != -1:
+                break
+        else:
+            raise ValueError("Chaîne base64 non terminée")
+        tmp.write(base64.b64decode(rest))
+    except Exception:
+        tmp.close()
+        raise
+    tmp.seek(0)
+    return tmp
+
+def _sniff_format(fh: IO[bytes]) -> Optional[str]:
+    """Retourne l'extension si le fichier est déjà un PNG/WebP exploitable tel quel."""
+    head = fh.read(12)
+    fh.seek(0)
+    if head.startswith(PNG_MAGIC):
+        ext = "png"
+    elif head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        # La taille déclarée dans l'en-tête RIFF doit couvrir tout le fichier
+        size = fh.seek(0, os.SEEK_END)
+        if int.from_bytes(head[4:8], "little") + 8 != size:
+            fh.seek(0)
+            return None
+        ext = "webp"
+    else:
+        return None
+    # verify() parcourt le fichier (CRC des blocs PNG) sans décoder les pixels
+    try:
+        Image.open(fh).verify()
+    except Exception as e:
+        logger.warning(f"Image {ext} invalide, transcodage: {e}")
+        ext = None
+    fh.seek(0)
+    return ext
+
+def _transcode_to_png(src: IO[bytes]) -> IO[bytes]:
+    """Convertit un fichier image quelconque en PNG (exécuté dans le pool dédié)."""
+    with src:
+        img = Image.open(src)
+        out = tempfile.TemporaryFile()
+        img.convert("RGB").save(out, format="PNG")
+    out.seek(0)
+    return out
+
+def _local_image_file(prompt: str) -> IO[bytes]:
+    tmp = tempfile.TemporaryFile()
+    render_local_image(prompt).save(tmp, format="PNG")
+    tmp.seek(0)
+    return tmp
+
+def generate_concept_image_file(prompt: str, draft: bool = False) -> Tuple[IO[bytes], str]:
+    """
+    Retourne (fichier temporaire, extension) à partir d'un prompt.
+    Le corps de la réponse (binaire, ou JSON base64 décodé au fil du flux) est
+    écrit sur disque par blocs ; les PNG/WebP sont conservés sans décodage.
+    Les autres formats sont transcodés en PNG dans un pool borné : le nombre
+    de décodages simultanés est plafonné, mais le thread de la requête attend
+    le résultat. L'appelant doit fermer le fichier.
+    En mode brouillon (ou GENERATION_MODE="local"), l'image est rendue localement.
+    """
+    if draft or _local_only():
+        return _local_image_file(prompt), "png"
     try:
         payload = {"inputs": prompt, "options": {"wait_for_model": True}}
         resp = _hf_post(IMG_MODEL, payload, stream=True)
         ctype = resp.headers.get("content-type", "")
+        tmp = None
 
-        # Cas 1 : image binaire directe
-        if "image/" in ctype:
-            content = resp.content
-            return Image.open(io.BytesIO(content)).convert("RGB")
-
-        # Cas 2 : JSON contenant du base64
         try:
-            data = resp.json()
-            for k in ("image", "generated_image", "images"):
-                if k in data:
-                    if isinstance(data[k], list) and data[k]:
-                        b64 = data[k][0]
-                    else:
-                        b64 = data[k]
-                    raw = base64.b64decode(b64)
-                    return Image.open(io.BytesIO(raw)).convert("RGB")
-        except Exception as e:
-            logger.error(f"Erreur de décodage image: {e}")
-            pass
+            # Cas 1 : image binaire directe
+            if "image/" in ctype:
+                tmp = _spool_response(resp)
+            else:
+                # Cas 2 : JSON contenant du base64
+                try:
+                    tmp = _spool_base64_json(resp.iter_content(chunk_size=IMG_CHUNK_SIZE))
+                except Exception as e:
+                    logger.error(f"Erreur de décodage image: {e}")
+        finally:
+            resp.close()
+
+        if tmp is None:
+            raise RuntimeError(f"Réponse image inattendue (content-type: {ctype})")
+
+        ext = _sniff_format(tmp)
+        if ext:
+            return tmp, ext
+        return _transcode_pool.submit(_transcode_to_png, tmp).result(), "png"
 
-        raise RuntimeError(f"Réponse image inattendue (content-type: {ctype})")
-    
     except Exception as e:
         logger.error(f"Erreur lors de la génération d'image: {e}")
         # Retourner une image de fallback
-        return Image.new('RGB', (512, 512), color=(73, 109, 137))
+        return _local_image_file(prompt), "png"
+
+def generate_concept_image(prompt: str, draft: bool = False) -> Image.Image:
+    """
+    Retourne une PIL.Image à partir d'un prompt. Gère image/png ou base64.
+    """
+    fh, _ = generate_concept_image_file(prompt, draft=draft)
+    with fh:
+        return Image.open(fh).convert("RGB")
 
 # --------- Exploration libre ---------
 def random_seed_game() -> Dict[str, str]:
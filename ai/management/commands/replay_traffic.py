@@ -0,0 +1,180 @@
+import io, json, time, threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from ai import generator
+from ai.procedural import generate_local_concept, render_local_image
+
+
+class _StubResponse:
+    """Réponse factice imitant l'API Hugging Face (texte JSON ou image PNG)."""
+
+    def __init__(self, body, content_type):
+        self.body = body
+        self.headers = {"content-type": content_type}
+
+    def json(self):
+        return json.loads(self.body)
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+_stub_state = threading.local()
+
+# Issues sans génération côté serveur (résultat partagé, verrou tenu, quota) :
+# le backend factice n'a pas de single-flight, les rejouer compterait des
+# générations qui n'ont jamais eu lieu.
+NON_GENERATING_OUTCOMES = {"shared", "conflict", "timeout", "quota"}
+
+
+@lru_cache(maxsize=1)
+def _stub_png():
+    # Rendu une seule fois : le backend factice ne doit pas peser sur la mesure
+    buf = io.BytesIO()
+    render_local_image("stub").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _stub_hf_post(model, payload, stream=False, max_retries=3):
+    # Latence simulée : durée enregistrée de l'étape courante
+    time.sleep(getattr(_stub_state, "delay", 0.0))
+    if model == generator.IMG_MODEL:
+        return _StubResponse(_stub_png(), "image/png")
+    text = json.dumps(generate_local_concept(), ensure_ascii=False)
+    return _StubResponse(json.dumps([{"generated_text": text}]).encode(), "application/json")
+
+
+@contextmanager
+def _stub_backend():
+    original = generator._hf_post
+    generator._hf_post = _stub_hf_post
+    try:
+        yield
+    finally:
+        generator._hf_post = original
+
+
+class Command(BaseCommand):
+    help = "Rejoue un journal de trafic de génération (GENERATION_TRAFFIC_LOG) contre une instance ou un backend factice."
+
+    def add_arguments(self, parser):
+        parser.add_argument("log", help="Fichier JSONL produit par ai.traffic")
+        parser.add_argument("--speed", type=float, default=1.0, help="Multiplicateur de vitesse (2 = deux fois plus vite)")
+        parser.add_argument("--target", default="", help="URL d'une instance en marche (ex: http://127.0.0.1:8000). Sans cible : backend factice local.")
+        parser.add_argument("--sessionid", default="", help="Cookie de session d'un utilisateur connecté (mode --target)")
+        parser.add_argument("--csrftoken", default="", help="Cookie CSRF associé (mode --target)")
+        parser.add_argument("--latency-scale", type=float, default=1.0, help="Échelle des latences simulées par le backend factice")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--limit", type=int, default=0, help="Nombre maximum d'évènements rejoués (0 = tous)")
+
+    def handle(self, *args, **opts):
+        if opts["speed"] <= 0:
+            raise CommandError("--speed doit être strictement positif")
+        events = self._load(opts["log"], opts["limit"])
+        skipped = 0
+        if not opts["target"]:
+            kept = [e for e in events if e.get("outcome") not in NON_GENERATING_OUTCOMES]
+            skipped, events = len(events) - len(kept), kept
+        if not events:
+            raise CommandError("Aucun évènement à rejouer")
+
+        if opts["target"]:
+            session = requests.Session()
+            session.cookies.set("sessionid", opts["sessionid"])
+            session.cookies.set("csrftoken", opts["csrftoken"])
+            run = lambda e: self._replay_remote(session, opts["target"].rstrip("/"), opts["csrftoken"], e)
+        else:
+            run = lambda e: self._replay_stub(e, opts["latency_scale"])
+
+        latencies, errors = [], 0
+        t0_log = events[0]["ts"]
+        start = time.monotonic()
+        with (nullcontext() if opts["target"] else _stub_backend()), ThreadPoolExecutor(max_workers=opts["concurrency"]) as pool:
+            futures = []
+            for event in events:
+                # Respecte l'espacement d'origine, divisé par la vitesse
+                delay = (event["ts"] - t0_log) / opts["speed"] - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(self._timed, run, event))
+            for f in futures:
+                ok, elapsed = f.result()
+                latencies.append(elapsed)
+                errors += not ok
+        wall = time.monotonic() - start
+
+        latencies.sort()
+        pct = lambda p: latencies[min(int(p * len(latencies)), len(latencies) - 1)] * 1000
+        self.stdout.write(
+            f"{len(latencies)} requêtes en {wall:.1f}s ({len(latencies) / wall:.2f} req/s), {errors} erreurs, "
+            f"{skipped} ignorées (sans génération)\n"
+            f"latence p50={pct(0.50):.0f}ms p95={pct(0.95):.0f}ms max={latencies[-1] * 1000:.0f}ms"
+        )
+
+    def _load(self, path, limit):
+        events = []
+        try:
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    line = line.strip()
+                    if line:
+                        events.append(json.loads(line))
+        except (OSError, json.JSONDecodeError) as e:
+            raise CommandError(f"Lecture du journal impossible: {e}")
+        events.sort(key=lambda e: e["ts"])
+        return events[:limit] if limit else events
+
+    @staticmethod
+    def _timed(run, event):
+        start = time.perf_counter()
+        try:
+            ok = run(event)
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    @staticmethod
+    def _replay_remote(session, target, csrftoken, event):
+        payload = {"project_id": event["project_id"], "draft": event.get("draft", False)}
+        url = f"{target}/generate/"
+        if event.get("section"):
+            payload["section"] = event["section"]
+            url = f"{target}/generate/section/"
+        resp = session.post(
+            url,
+            json=payload,
+            headers={"X-CSRFToken": csrftoken, "Referer": f"{target}/"},
+            timeout=600,
+        )
+        return resp.status_code == 200
+
+    @staticmethod
+    def _replay_stub(event, latency_scale):
+        inputs = event.get("inputs", {})
+        timings = event.get("timings", {})
+        ambiance = inputs.get("ambiance") or "stylized"
+
+        _stub_state.delay = timings.get("text_ms", 0) / 1000 * latency_scale
+        if event.get("section"):
+            generator.regenerate_section(inputs.get("title", ""), inputs.get("genre", ""), inputs.get("ambiance", ""),
+                                         inputs.get("keywords", ""), inputs.get("references", ""),
+                                         generate_local_concept(), event["section"], draft=event.get("draft", False))
+            return True
+        generator.generate_structured_game(inputs.get("title", ""), inputs.get("genre", ""), inputs.get("ambiance", ""),
+                                           inputs.get("keywords", ""), inputs.get("references", ""),
+                                           draft=event.get("draft", False))
+        for stage, prompt in (("image_character", f"Concept art character, {ambiance}"),
+                              ("image_environment", f"Concept art environment, {ambiance}")):
+            _stub_state.delay = timings.get(f"{stage}_ms", 0) / 1000 * latency_scale
+            fh, _ = generator.generate_concept_image_file(prompt, draft=event.get("draft", False))
+            fh.close()
+        return True
@@ -0,0 +1,203 @@
+"""
+Générateur local (hors-ligne) de concepts et d'images.
+
+Utilisé comme mode dégradé quand l'API Hugging Face est indisponible, ou
+comme brouillon rapide. Tout tourne en quelques millisecondes.
+"""
+import random, zlib
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from PIL import Image
+
+# --------- Grammaire TEXTE ---------
+SYLLABLES = ["ael", "ryn", "ka", "len", "mor", "vex", "tha", "lio", "zar", "eth",
+             "syl", "dra", "nox", "ira", "bel", "quen", "or", "ys", "val", "kor"]
+
+CLASSES = {
+    "rpg": ["Mage", "Guerrier", "Rôdeur", "Alchimiste", "Paladin"],
+    "fps": ["Éclaireur", "Tireur d'élite", "Démolisseur", "Médecin de combat", "Ingénieur"],
+    "metroidvania": ["Chasseuse", "Acrobate", "Porteur de relique", "Sentinelle"],
+    "visual novel": ["Enquêtrice", "Étudiant", "Archiviste", "Confident"],
+    "rogue": ["Vagabond", "Duelliste", "Invocatrice", "Pyromancien"],
+    "tactique": ["Commandant", "Artilleur", "Stratège", "Éclaireuse"],
+}
+DEFAULT_CLASSES = ["Aventurier", "Mercenaire", "Érudite", "Hors-la-loi"]
+
+ROLES = ["Protagoniste", "Compagnon", "Rival", "Mentor", "Antagoniste"]
+
+BACKGROUNDS = [
+    "hanté(e) par {kw}, cherche à comprendre ce qui lui a été pris",
+    "ancien(ne) membre d'une faction liée à {kw}",
+    "survivant(e) d'un monde {amb} qui refuse de baisser les bras",
+    "a juré de mettre fin à {kw}, quel qu'en soit le prix",
+    "ignore encore le rôle qu'il/elle a joué dans {kw}",
+]
+
+GAMEPLAY = {
+    "rpg": ["arbres de compétences et dialogues à choix", "magie élémentaire et gestion d'équipe"],
+    "fps": ["gunplay nerveux et gadgets tactiques", "mobilité verticale et armes modulaires"],
+    "metroidvania": ["capacités de déplacement qui débloquent la carte", "combat au corps à corps précis"],
+    "visual novel": ["choix narratifs aux conséquences durables", "enquête et déduction"],
+    "rogue": ["runs courtes et synergies d'objets", "builds aléatoires et méta-progression"],
+    "tactique": ["combat au tour par tour sur grille", "positionnement et couverture"],
+}
+DEFAULT_GAMEPLAY = ["exploration libre et combat dynamique", "résolution d'énigmes environnementales"]
+
+PLACE_NOUNS = ["Cité", "Forêt", "Citadelle", "Archipel", "Désert", "Bas-fonds", "Observatoire", "Nécropole"]
+PLACE_ADJS = ["Engloutie", "des Échos", "Fracturée", "Silencieuse", "de Verre", "Oubliée", "Suspendue"]
+PLACE_DESCS = [
+    "un lieu {amb} où {kw} a laissé des cicatrices visibles",
+    "un refuge précaire, dernier bastion face à {kw}",
+    "une zone interdite dont personne n'est revenu indemne",
+    "le cœur du conflit, façonné par {kw}",
+]
+
+UNIVERSES = [
+    "Un monde {amb} où {kw} a redessiné les frontières entre les peuples. "
+    "Les survivants s'organisent autour de vestiges dont ils ignorent l'origine.",
+    "Dans un univers {amb}, {kw} est devenu(e) la seule loi. "
+    "Chaque faction prétend en détenir la clé, aucune ne dit la vérité.",
+    "Un {genre} {amb} où {kw} déchire le quotidien. "
+    "Le joueur explore un monde en équilibre fragile, au bord de la rupture.",
+]
+ACTS = {
+    "act1": [
+        "{hero} découvre les premiers signes de {kw} et quitte son foyer.",
+        "Une rencontre inattendue entraîne {hero} au cœur de {kw}.",
+    ],
+    "act2": [
+        "{hero} et {ally} traversent {place} et mettent au jour une alliance secrète.",
+        "Les certitudes de {hero} s'effondrent à {place} ; {ally} doit choisir son camp.",
+    ],
+    "act3": [
+        "Confrontation finale à {place}, où {hero} doit sacrifier ce qu'il/elle a de plus cher.",
+        "{hero} retourne {kw} contre ses créateurs dans un affrontement décisif.",
+    ],
+}
+TWISTS = [
+    "{ally} est à l'origine de {kw} depuis le début.",
+    "{hero} n'est qu'un écho d'une boucle précédente.",
+    "{place} n'a jamais existé : c'est un souvenir partagé.",
+]
+PITCHES = [
+    "Un {genre} {amb} où {kw} change tout. Chaque choix compte, chaque perte se paie.",
+    "Plongez dans un {genre} {amb} porté par {kw}. Explorez, affrontez, et découvrez ce que cache {place}.",
+]
+
+
+def _rng(*parts: str, seed: Optional[int] = None) -> random.Random:
+    if seed is None:
+        seed = random.getrandbits(32)
+    return random.Random(zlib.crc32("|".join(parts).encode()) ^ seed)
+
+
+def _pick_pool(table: Dict[str, List[str]], genre: str, default: List[str]) -> List[str]:
+    g = genre.lower()
+    for key, pool in table.items():
+        if key in g:
+            return pool
+    return default
+
+
+def _name(rng: random.Random) -> str:
+    return "".join(rng.sample(SYLLABLES, rng.randint(2, 3))).capitalize()
+
+
+def generate_local_concept(title: str = "", genre: str = "", ambiance: str = "", keywords: str = "",
+                           references: str = "", seed: Optional[int] = None,
+                           names: Optional[List[str]] = None, places: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Concept complet (même schéma que generate_structured_game) par grammaire.
+    `names` / `places` : noms de personnages et de lieux à réutiliser (concept
+    existant), pour qu'une section régénérée reste cohérente avec le reste.
+    """
+    rng = _rng(title, genre, ambiance, keywords, references, seed=seed)
+    kws = [k.strip() for k in keywords.split(",") if k.strip()] or ["un mystère ancien"]
+    amb = ambiance or "mystérieux"
+    gen = genre or "jeu d'aventure"
+
+    classes = _pick_pool(CLASSES, gen, DEFAULT_CLASSES)
+    gameplays = _pick_pool(GAMEPLAY, gen, DEFAULT_GAMEPLAY)
+    names = [n for n in names or [] if n]
+    characters = []
+    for i in range(max(rng.randint(2, 4), len(names))):
+        kw = rng.choice(kws)
+        characters.append({
+            "name": names[i] if i < len(names) else _name(rng),
+            "class": rng.choice(classes),
+            "role": ROLES[i] if i < 2 else rng.choice(ROLES[2:]),
+            "background": rng.choice(BACKGROUNDS).format(kw=kw, amb=amb).capitalize(),
+            "gameplay": rng.choice(gameplays).capitalize(),
+        })
+    places = [p for p in places or [] if p]
+    if not places:
+        places = [f"{noun} {adj}" for noun, adj in zip(rng.sample(PLACE_NOUNS, 3), rng.sample(PLACE_ADJS, 3))]
+        places = places[:rng.randint(2, 3)]
+    locations = [
+        {"name": place, "description": rng.choice(PLACE_DESCS).format(kw=rng.choice(kws), amb=amb).capitalize()}
+        for place in places
+    ]
+
+    ctx = {
+        "kw": rng.choice(kws), "amb": amb, "genre": gen,
+        "hero": characters[0]["name"], "ally": characters[1]["name"],
+        "place": locations[-1]["name"],
+    }
+    return {
+        "universe": rng.choice(UNIVERSES).format(**ctx),
+        "scenario": {act: rng.choice(lines).format(**ctx) for act, lines in ACTS.items()},
+        "twist": rng.choice(TWISTS).format(**ctx),
+        "characters": characters,
+        "locations": locations,
+        "pitch": rng.choice(PITCHES).format(**ctx),
+    }
+
+
+# --------- Rendu IMAGE ---------
+# Palettes (positions 0..1 -> RGB) choisies selon l'ambiance détectée dans le prompt
+PALETTES = {
+    "cyberpunk": [(8, 4, 28), (90, 20, 120), (230, 40, 160), (40, 230, 240)],
+    "dark fantasy": [(5, 5, 8), (40, 12, 50), (120, 20, 30), (200, 170, 120)],
+    "onirique": [(60, 70, 140), (150, 130, 210), (240, 180, 220), (255, 240, 220)],
+    "post-apo": [(30, 22, 15), (100, 70, 40), (190, 120, 60), (235, 200, 140)],
+    "low-poly": [(30, 60, 140), (40, 170, 150), (250, 200, 60), (250, 110, 90)],
+}
+DEFAULT_PALETTE = [(20, 35, 55), (73, 109, 137), (140, 180, 200), (230, 240, 245)]
+
+
+def _palette_for(prompt: str) -> List[tuple]:
+    p = prompt.lower()
+    for key, palette in PALETTES.items():
+        if key in p:
+            return palette
+    return DEFAULT_PALETTE
+
+
+def _value_noise(rng: np.random.Generator, size: int, octaves: int = 5) -> np.ndarray:
+    """Bruit fractal : grilles aléatoires agrandies par interpolation bilinéaire."""
+    acc = np.zeros((size, size), dtype=np.float32)
+    amp, total = 1.0, 0.0
+    for o in range(octaves):
+        cells = 2 ** (o + 2)
+        grid = (rng.random((cells, cells)) * 255).astype(np.uint8)
+        layer = Image.fromarray(grid, mode="L").resize((size, size), Image.BILINEAR)
+        acc += amp * np.asarray(layer, dtype=np.float32)
+        total += amp
+        amp *= 0.5
+    return acc / (total * 255.0)
+
+
+def render_local_image(prompt: str, size: int = 512, seed: Optional[int] = None) -> Image.Image:
+    """Image procédurale (dégradé + bruit fractal) colorée selon l'ambiance du prompt."""
+    if seed is None:
+        seed = random.getrandbits(32)
+    rng = np.random.default_rng(zlib.crc32(prompt.encode()) ^ seed)
+    noise = _value_noise(rng, size)
+    gradient = np.linspace(0.0, 1.0, size, dtype=np.float32)[:, None]
+    field = np.clip(0.55 * noise + 0.45 * gradient, 0.0, 1.0)
+
+    palette = np.asarray(_palette_for(prompt), dtype=np.float32)
+    stops = np.linspace(0.0, 1.0, len(palette))
+    rgb = np.stack([np.interp(field, stops, palette[:, c]) for c in range(3)], axis=-1)
+    return Image.fromarray(rgb.astype(np.uint8), mode="RGB")
@@ -1,3 +1,157 @@
-from django.test import TestCase
+import io, json, base64, tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from ai import generator, traffic
+
+
+class _FakeImageResponse:
+    def __init__(self, body, content_type):
+        self.body = body
+        self.headers = {"content-type": content_type}
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+def _image_bytes(fmt, size=(64, 48)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (10, 20, 30)).save(buf, format=fmt)
+    return buf.getvalue()
+
+
+class ConceptImageFileTests(SimpleTestCase):
+
+    def _generate(self, body, content_type):
+        with mock.patch.object(generator, "_hf_post", return_value=_FakeImageResponse(body, content_type)):
+            fh, ext = generator.generate_concept_image_file("cyberpunk")
+        with fh:
+            return ext, Image.open(fh).size
+
+    def test_valid_png_and_webp_are_kept_as_is(self):
+        self.assertEqual(self._generate(_image_bytes("PNG"), "image/png"), ("png", (64, 48)))
+        self.assertEqual(self._generate(_image_bytes("WEBP"), "image/webp"), ("webp", (64, 48)))
+
+    def test_other_formats_are_transcoded_to_png(self):
+        self.assertEqual(self._generate(_image_bytes("JPEG"), "image/jpeg"), ("png", (64, 48)))
+
+    def test_base64_json_is_decoded_from_the_stream(self):
+        png = _image_bytes("PNG")
+        b64 = base64.b64encode(png).decode()
+        # Échappements JSON ("\\/", "\\n") et blocs de 7 octets qui coupent clés et échappements
+        escaped = "\\n".join(b64[i:i + 60] for i in range(0, len(b64), 60)).replace("/", "\\/")
+        body = ('{"model": "x", "images": ["' + escaped + '"]}').encode()
+        chunks = (body[i:i + 7] for i in range(0, len(body), 7))
+        with generator._spool_base64_json(chunks) as fh:
+            self.assertEqual(fh.read(), png)
+        self.assertEqual(self._generate(('{"image": "%s"}' % b64).encode(), "application/json"), ("png", (64, 48)))
+        self.assertIsNone(generator._spool_base64_json([b'{"error": "overloaded"}']))
+
+    def test_truncated_images_fall_back_to_local_render(self):
+        # 512x512 : taille du rendu procédural de secours
+        self.assertEqual(self._generate(_image_bytes("PNG")[:-30], "image/png"), ("png", (512, 512)))
+        self.assertEqual(self._generate(_image_bytes("WEBP")[:-10], "image/webp"), ("png", (512, 512)))
+
+
+class GenerationModeTests(SimpleTestCase):
+
+    @override_settings(GENERATION_MODE="local")
+    def test_local_mode_setting_skips_remote_api(self):
+        with mock.patch.object(generator, "_hf_post") as hf_post:
+            concept = generator.generate_structured_game("T", "RPG", "cyberpunk", "IA rebelle", "")
+            fh, ext = generator.generate_concept_image_file("cyberpunk")
+            fh.close()
+        hf_post.assert_not_called()
+        self.assertEqual(set(concept), {"universe", "scenario", "twist", "characters", "locations", "pitch"})
+        self.assertEqual(ext, "png")
+
+
+class TrafficLogTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.log = Path(self.tmp.name) / "traffic.jsonl"
+
+    def test_log_path_is_read_from_settings(self):
+        with override_settings(GENERATION_TRAFFIC_LOG=str(self.log)):
+            with traffic.trace(project_id=1, draft=True, inputs={}):
+                traffic.annotate(text_model="local")
+            traffic.get_recorder().close()
+        self.assertEqual(json.loads(self.log.read_text())["text_model"], "local")
+        with override_settings(GENERATION_TRAFFIC_LOG=""):
+            self.assertIsNone(traffic.get_recorder())
+
+    def test_stub_replay_skips_non_generating_outcomes(self):
+        inputs = {"title": "T", "genre": "RPG", "ambiance": "cyberpunk", "keywords": "", "references": ""}
+        events = [{"ts": 0.0, "project_id": 1, "draft": True, "inputs": inputs, "outcome": outcome, "timings": {}}
+                  for outcome in ("ok", "shared", "conflict", "quota", "timeout")]
+        self.log.write_text("".join(json.dumps(e) + "\n" for e in events))
+        out = io.StringIO()
+        call_command("replay_traffic", str(self.log), stdout=out)
+        self.assertIn("1 requêtes", out.getvalue())
+        self.assertIn("4 ignorées", out.getvalue())
+
+
+class SectionTests(SimpleTestCase):
+    concept = {
+        "universe": "Un monde en ruines.",
+        "scenario": {"act1": "Départ.", "act2": "Trahison.", "act3": "Final."},
+        "characters": [{"name": "Ilya", "class": "Mage", "role": "Protagoniste", "background": "B", "gameplay": "G"},
+                       {"name": "Moro", "class": "Rôdeur", "role": "Compagnon", "background": "B", "gameplay": "G"}],
+        "locations": [{"name": "Port Gris", "description": "D"}, {"name": "Tour Noire", "description": "D"}],
+    }
+
+    def test_get_section_follows_dotted_paths(self):
+        self.assertEqual(generator.get_section(self.concept, "scenario.act2"), "Trahison.")
+        self.assertIsNone(generator.get_section({}, "scenario.act2"))
+        self.assertIsNone(generator.get_section({"scenario": "texte"}, "scenario.act2"))
+
+    def test_merge_section_replaces_only_the_section(self):
+        merged = generator.merge_section(self.concept, "scenario.act2", "Alliance.")
+        self.assertEqual(merged["scenario"], {"act1": "Départ.", "act2": "Alliance.", "act3": "Final."})
+        self.assertEqual(self.concept["scenario"]["act2"], "Trahison.")
+        self.assertEqual(generator.merge_section(None, "scenario.act1", "A"), {"scenario": {"act1": "A"}})
+        self.assertEqual(generator.merge_section({"scenario": "texte"}, "scenario.act1", "A"), {"scenario": {"act1": "A"}})
+        self.assertEqual(generator.merge_section(self.concept, "twist", "T")["twist"], "T")
+
+    def test_valid_section_checks_shape(self):
+        self.assertTrue(generator.valid_section("scenario", self.concept["scenario"]))
+        self.assertFalse(generator.valid_section("scenario", {"scenario": self.concept["scenario"]}))
+        self.assertTrue(generator.valid_section("characters", self.concept["characters"]))
+        self.assertFalse(generator.valid_section("characters", [{"name": "Bob"}]))
+        self.assertFalse(generator.valid_section("locations", ["Port Gris"]))
+        self.assertFalse(generator.valid_section("twist", "   "))
+
+    def _regenerate(self, section, draft=False):
+        return generator.regenerate_section("T", "RPG", "sombre", "", "", self.concept, section, draft=draft)
+
+    def test_invalid_remote_section_falls_back_to_local_value(self):
+        reply = '{"characters": [{"name": "Bob"}]}'
+        with mock.patch.object(generator, "generate_with_fallback", return_value=reply):
+            value = self._regenerate("characters")
+        self.assertTrue(generator.valid_section("characters", value))
+        self.assertNotIn("Bob", [c["name"] for c in value])
+
+    def test_failed_remote_cascade_falls_back_to_existing_names(self):
+        with mock.patch.object(generator, "_hf_post", side_effect=RuntimeError("API indisponible")):
+            twist = self._regenerate("twist")
+            scenario = self._regenerate("scenario")
+        self.assertTrue(any(name in twist for name in ("Ilya", "Moro", "Tour Noire")), twist)
+        self.assertIn("Ilya", scenario["act1"])
+
+    def test_regenerated_section_gets_new_names(self):
+        for section, key, old in (("locations", "name", {"Port Gris", "Tour Noire"}),
+                                  ("characters", "name", {"Ilya", "Moro"})):
+            with self.subTest(section=section):
+                value = self._regenerate(section, draft=True)
+                self.assertTrue(generator.valid_section(section, value))
+                self.assertFalse(old & {item[key] for item in value})
@@ -0,0 +1,168 @@
+"""
+Journal du trafic de génération au format JSONL.
+
+Chaque génération produit un évènement (entrées, modèle utilisé, tentatives,
+durées par étape, issue). Les évènements passent par une file en mémoire et
+sont écrits par lots par un thread d'arrière-plan : la requête ne touche
+jamais le disque. Si la file est pleine, l'évènement est abandonné (compteur
+`dropped`) plutôt que de bloquer.
+
+Activé par le réglage GENERATION_TRAFFIC_LOG (chemin du fichier, lu dans
+l'environnement si Django n'est pas configuré).
+Rejouable avec `python manage.py replay_traffic <fichier>`.
+"""
+import os, json, time, queue, atexit, logging, threading, contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 1.0  # secondes
+BATCH_SIZE = 200
+QUEUE_SIZE = 10000
+
+_STOP = object()
+
+
+class TrafficRecorder:
+    def __init__(self, path: str, flush_interval: float = FLUSH_INTERVAL,
+                 batch_size: int = BATCH_SIZE, maxsize: int = QUEUE_SIZE):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def record(self, event: Dict[str, Any]):
+        """Ajoute un évènement sans bloquer."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="traffic-recorder", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        try:
+            dirname = os.path.dirname(self.path)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write("".join(json.dumps(e, ensure_ascii=False, default=str) + "\n" for e in batch))
+        except OSError as e:
+            logger.error(f"Écriture du journal de trafic impossible: {e}")
+
+
+_recorder: Optional[TrafficRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def _log_path() -> str:
+    if settings.configured:
+        return getattr(settings, "GENERATION_TRAFFIC_LOG", "")
+    return os.environ.get("GENERATION_TRAFFIC_LOG", "")
+
+
+def get_recorder() -> Optional[TrafficRecorder]:
+    """Enregistreur du journal configuré (None si désactivé), créé au premier évènement."""
+    global _recorder
+    path = _log_path()
+    if not path:
+        return None
+    with _recorder_lock:
+        if _recorder is None or _recorder.path != path:
+            if _recorder is not None:
+                _recorder.close()
+            _recorder = TrafficRecorder(path)
+        return _recorder
+
+
+@atexit.register
+def _close_recorder():
+    if _recorder is not None:
+        _recorder.close()
+
+# --------- Trace de la génération en cours ---------
+_current: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("generation_trace", default=None)
+
+
+@contextmanager
+def trace(**fields):
+    """Ouvre l'évènement de la génération courante ; il est enregistré à la sortie."""
+    event = {"ts": time.time(), **fields, "text_model": None, "attempts": 0, "timings": {}, "outcome": "ok"}
+    token = _current.set(event)
+    start = time.perf_counter()
+    try:
+        yield event
+    except Exception:
+        event["outcome"] = "error"
+        raise
+    finally:
+        event["timings"]["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        _current.reset(token)
+        recorder = get_recorder()
+        if recorder is not None:
+            recorder.record(event)
+
+
+@contextmanager
+def stage(name: str):
+    """Chronomètre une étape (texte, images...) de la génération courante."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        event = _current.get()
+        if event is not None:
+            event["timings"][f"{name}_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def annotate(**fields):
+    event = _current.get()
+    if event is not None:
+        event.update(fields)
+
+
+def count_attempt():
+    event = _current.get()
+    if event is not None:
+        event["attempts"] += 1
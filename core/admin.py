@@ -1,5 +1,12 @@
+import datetime
+
 from django.contrib import admin
-from .models import GameProject, Favorite, ApiUsage
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .models import GameProject, Favorite, ApiUsage, ApiUsageMonthly
 
 @admin.register(GameProject)
 class GameProjectAdmin(admin.ModelAdmin):
@@ -12,4 +19,49 @@ class FavoriteAdmin(admin.ModelAdmin):
 
 @admin.register(ApiUsage)
 class ApiUsageAdmin(admin.ModelAdmin):
-    list_display = ("user", "day_key", "count")
\ No newline at end of file
+    list_display = ("user", "day", "count")
+    list_select_related = ("user",)
+    search_fields = ("user__username",)
+    date_hierarchy = "day"
+    change_list_template = "admin/core/apiusage/change_list.html"
+    report_days = 30
+    report_top_users = 50
+
+    def get_urls(self):
+        report = path("report/", self.admin_site.admin_view(self.report_view), name="core_apiusage_report")
+        return [report] + super().get_urls()
+
+    def report_view(self, request):
+        """Totaux par jour, par mois et par utilisateur, calculés par agrégats SQL."""
+        since = datetime.datetime.utcnow().date() - datetime.timedelta(days=self.report_days)
+        per_day = (ApiUsage.objects.filter(day__gte=since)
+                   .values("day").annotate(total=Sum("count"), users=Count("user_id"))
+                   .order_by("-day"))
+        per_user = (ApiUsage.objects.filter(day__gte=since)
+                    .values("user__username").annotate(total=Sum("count"))
+                    .order_by("-total")[:self.report_top_users])
+
+        # Mois : agrégats archivés + jours encore présents dans ApiUsage
+        months = {}
+        for row in ApiUsageMonthly.objects.values("month").annotate(total=Sum("count")):
+            months[row["month"]] = row["total"]
+        for row in ApiUsage.objects.annotate(month=TruncMonth("day")).values("month").annotate(total=Sum("count")).order_by():
+            months[row["month"]] = months.get(row["month"], 0) + row["total"]
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Rapport d'utilisation de l'API",
+            "report_days": self.report_days,
+            "per_day": per_day,
+            "per_user": per_user,
+            "per_month": sorted(months.items(), reverse=True),
+        }
+        return TemplateResponse(request, "admin/core/apiusage/report.html", context)
+
+@admin.register(ApiUsageMonthly)
+class ApiUsageMonthlyAdmin(admin.ModelAdmin):
+    list_display = ("user", "month", "count")
+    list_select_related = ("user",)
+    search_fields = ("user__username",)
+    date_hierarchy = "month"
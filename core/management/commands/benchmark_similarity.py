@@ -0,0 +1,52 @@
+import time, tempfile
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from core.similarity import DIM, SimilarityIndex
+
+
+class Command(BaseCommand):
+    help = "Mesure la latence de l'index de similarité sur un index synthétique de --n projets."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--n", type=int, default=100_000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--k", type=int, default=6)
+
+    def handle(self, *args, **opts):
+        n, k = opts["n"], opts["k"]
+        rng = np.random.default_rng(0)
+        with tempfile.TemporaryDirectory() as directory:
+            index = SimilarityIndex(directory)
+
+            def items(batch=10_000):
+                for start in range(0, n, batch):
+                    vectors = rng.standard_normal((min(batch, n - start), DIM)).astype(np.float32)
+                    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                    yield from zip(range(start + 1, start + 1 + len(vectors)), vectors)
+
+            t0 = time.perf_counter()
+            index.rebuild(items())
+            build = time.perf_counter() - t0
+
+            queries = rng.standard_normal((opts["queries"], DIM)).astype(np.float32)
+            index.query(queries[0], k)  # chargement du memmap / cache OS
+            latencies = []
+            for q in queries:
+                t = time.perf_counter()
+                index.query(q, k, exclude=1)
+                latencies.append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            index.upsert(n // 2, queries[0])
+            index.upsert(n + 1, queries[1])
+            upsert = (time.perf_counter() - t) / 2
+
+        latencies = np.array(latencies) * 1000
+        self.stdout.write(
+            f"{n} projets (dim={DIM}, {n * DIM * 4 / 1e6:.0f} Mo) : construction {build:.2f}s\n"
+            f"requête top-{k} : p50={np.percentile(latencies, 50):.2f}ms "
+            f"p95={np.percentile(latencies, 95):.2f}ms max={latencies.max():.2f}ms\n"
+            f"mise à jour incrémentale : {upsert * 1000:.1f}ms"
+        )
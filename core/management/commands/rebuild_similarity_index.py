@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.models import GameProject
+from core.similarity import get_index, vectorize
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index des projets similaires à partir des projets publics (et le compacte)."
+
+    def handle(self, *args, **opts):
+        projects = (GameProject.objects.filter(is_public=True)
+                    .only("id", "title", "genre", "ambiance", "keywords", "generated", "is_public")
+                    .order_by("id").iterator(chunk_size=2000))
+        count = 0
+
+        def items():
+            nonlocal count
+            for project in projects:
+                count += 1
+                yield project.id, vectorize(project)
+
+        get_index().rebuild(items())
+        self.stdout.write(f"{count} projet(s) indexé(s).")
@@ -0,0 +1,42 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+
+from core.models import ApiUsage, ApiUsageMonthly
+
+
+class Command(BaseCommand):
+    help = ("Agrège en totaux mensuels les ApiUsage plus anciens que --keep-days puis les supprime par lots. "
+            "À lancer périodiquement (cron quotidien).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-days", type=int, default=settings.API_USAGE_RETENTION_DAYS)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        cutoff = datetime.datetime.utcnow().date() - datetime.timedelta(days=opts["keep_days"])
+        old = ApiUsage.objects.filter(day__lt=cutoff)
+        processed = 0
+        while True:
+            # Chaque lot est agrégé puis supprimé dans la même transaction :
+            # une interruption ne peut ni perdre ni compter deux fois une ligne.
+            with transaction.atomic():
+                ids = list(old.order_by("id").values_list("id", flat=True)[:opts["batch_size"]])
+                if not ids:
+                    break
+                batch = ApiUsage.objects.filter(id__in=ids)
+                totals = (batch.annotate(month=TruncMonth("day"))
+                          .values("user_id", "month").annotate(total=Sum("count")).order_by())
+                for row in totals:
+                    monthly, created = ApiUsageMonthly.objects.get_or_create(
+                        user_id=row["user_id"], month=row["month"], defaults={"count": row["total"]},
+                    )
+                    if not created:
+                        ApiUsageMonthly.objects.filter(pk=monthly.pk).update(count=F("count") + row["total"])
+                batch.delete()
+            processed += len(ids)
+        self.stdout.write(f"{processed} ligne(s) journalière(s) agrégée(s) et supprimée(s) (avant le {cutoff}).")
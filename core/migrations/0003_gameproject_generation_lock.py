@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-19 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_apiusage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameproject',
+            name='generation_key',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='gameproject',
+            name='generation_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.23 on 2026-10-19 08:02
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def day_key_to_day(apps, schema_editor):
+    ApiUsage = apps.get_model("core", "ApiUsage")
+    for usage in ApiUsage.objects.all().only("id", "day_key"):
+        usage.day = datetime.datetime.strptime(usage.day_key, "%Y%m%d").date()
+        usage.save(update_fields=["day"])
+
+
+def day_to_day_key(apps, schema_editor):
+    ApiUsage = apps.get_model("core", "ApiUsage")
+    for usage in ApiUsage.objects.all().only("id", "day"):
+        usage.day_key = usage.day.strftime("%Y%m%d")
+        usage.save(update_fields=["day_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0003_gameproject_generation_lock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apiusage',
+            name='day',
+            field=models.DateField(null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='apiusage',
+            unique_together=set(),
+        ),
+        # Nullable le temps de la migration, pour que le retour arrière puisse la remplir
+        migrations.AlterField(
+            model_name='apiusage',
+            name='day_key',
+            field=models.CharField(max_length=10, null=True),
+        ),
+        migrations.RunPython(day_key_to_day, day_to_day_key),
+        migrations.RemoveField(
+            model_name='apiusage',
+            name='day_key',
+        ),
+        migrations.AlterField(
+            model_name='apiusage',
+            name='day',
+            field=models.DateField(db_index=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='apiusage',
+            unique_together={('user', 'day')},
+        ),
+        migrations.CreateModel(
+            name='ApiUsageMonthly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(db_index=True)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'month')},
+            },
+        ),
+    ]
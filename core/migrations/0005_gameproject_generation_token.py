@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-19 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_apiusage_day_apiusagemonthly'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameproject',
+            name='generation_done_token',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='gameproject',
+            name='generation_token',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
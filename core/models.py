@@ -18,6 +18,12 @@ class GameProject(models.Model):
     generated = models.JSONField(null=True, blank=True)
     image_character = models.ImageField(upload_to="generated/characters/", null=True, blank=True)
     image_environment = models.ImageField(upload_to="generated/environments/", null=True, blank=True)
+    # Verrou de génération (single-flight) : hash des entrées en cours de génération,
+    # jeton unique du détenteur, et jeton de la dernière génération réussie
+    generation_key = models.CharField(max_length=64, blank=True, default="")
+    generation_token = models.CharField(max_length=32, blank=True, default="")
+    generation_started_at = models.DateTimeField(null=True, blank=True)
+    generation_done_token = models.CharField(max_length=32, blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -43,8 +49,17 @@ class Favorite(models.Model):
 
 class ApiUsage(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    day_key = models.CharField(max_length=10)  # format YYYYMMDD
+    day = models.DateField(db_index=True)  # jour UTC
     count = models.IntegerField(default=0)
 
     class Meta:
-        unique_together = ("user", "day_key")
\ No newline at end of file
+        unique_together = ("user", "day")
+
+class ApiUsageMonthly(models.Model):
+    """Agrégat mensuel des ApiUsage purgés (voir `manage.py rollup_api_usage`)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    month = models.DateField(db_index=True)  # premier jour du mois
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("user", "month")
\ No newline at end of file
@@ -0,0 +1,24 @@
+import logging
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import GameProject
+from .similarity import get_index, index_project
+
+logger = logging.getLogger(__name__)
+
+@receiver(post_save, sender=GameProject)
+def update_similarity_index(sender, instance, **kwargs):
+    # Mise à jour incrémentale : ne doit jamais faire échouer la sauvegarde
+    try:
+        index_project(instance)
+    except OSError as e:
+        logger.error(f"Mise à jour de l'index de similarité impossible: {e}")
+
+@receiver(post_delete, sender=GameProject)
+def remove_from_similarity_index(sender, instance, **kwargs):
+    try:
+        get_index().remove(instance.id)
+    except OSError as e:
+        logger.error(f"Mise à jour de l'index de similarité impossible: {e}")
@@ -0,0 +1,194 @@
+"""
+Index de similarité des projets publics ("projets similaires").
+
+Chaque projet est résumé par un vecteur de hachage signé (feature hashing,
+TF logarithmique, pondéré par champ) de dimension fixe, normalisé L2.
+Les vecteurs sont stockés sur disque dans deux fichiers bruts ajoutables :
+
+- ids.i64     : identifiants des projets, un int64 par ligne
+- vectors.f32 : matrice N x DIM en float32, lue par memory-mapping
+
+Une sauvegarde met à jour la ligne du projet (ou en ajoute une), sans
+reconstruire l'index. La recherche est un produit matrice-vecteur suivi
+d'un argpartition : quelques millisecondes pour 100k projets.
+`manage.py rebuild_similarity_index` reconstruit (et compacte) l'index,
+`manage.py benchmark_similarity` mesure la latence des requêtes.
+"""
+import os, re, math, zlib, logging
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-processus
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DIM = 256
+FIELD_WEIGHTS = (("genre", 2.0), ("ambiance", 2.0), ("keywords", 1.5), ("title", 1.0))
+GENERATED_WEIGHT = 1.0
+TOKEN_RE = re.compile(r"\w{3,}")
+STOPWORDS = {
+    "les", "des", "une", "dans", "pour", "par", "sur", "avec", "est", "sont", "qui", "que", "son",
+    "ses", "leur", "leurs", "aux", "ces", "cette", "mais", "plus", "tout", "tous", "elle",
+    "ils", "elles", "entre", "sans", "sous", "vers", "chaque", "dont", "nom", "the", "and",
+}
+
+
+def _generated_texts(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for key, sub in value.items():
+            if key != "raw_text":
+                yield from _generated_texts(sub)
+    elif isinstance(value, list):
+        for sub in value:
+            yield from _generated_texts(sub)
+
+
+def vectorize(project):
+    """Vecteur float32 normalisé décrivant le projet (genre, ambiance, mots-clés, contenu généré)."""
+    weights = {}
+    fields = [(getattr(project, name) or "", w) for name, w in FIELD_WEIGHTS]
+    fields += [(text, GENERATED_WEIGHT) for text in _generated_texts(project.generated or {})]
+    for text, field_weight in fields:
+        counts = {}
+        for token in TOKEN_RE.findall(text.lower()):
+            if token not in STOPWORDS:
+                counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            weights[token] = weights.get(token, 0.0) + field_weight * (1.0 + math.log(count))
+
+    vec = np.zeros(DIM, dtype=np.float32)
+    for token, weight in weights.items():
+        h = zlib.crc32(token.encode())
+        vec[h % DIM] += weight if h & 0x80000000 else -weight
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class SimilarityIndex:
+
+    def __init__(self, directory, dim=DIM):
+        self.directory = Path(directory)
+        self.dim = dim
+        self.ids_path = self.directory / "ids.i64"
+        self.vectors_path = self.directory / "vectors.f32"
+        self.lock_path = self.directory / "index.lock"
+        self._cache = None  # (signature du fichier, ids, vecteurs)
+
+    @contextmanager
+    def _locked(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self, force=False):
+        # inode + taille des deux fichiers : détecte les ajouts et les rebuilds
+        # (os.replace) d'autres processus, y compris entre l'écriture des deux
+        stats = [path.stat() if path.exists() else None for path in (self.vectors_path, self.ids_path)]
+        signature = tuple((st.st_ino, st.st_size) if st else None for st in stats)
+        if not force and self._cache is not None and self._cache[0] == signature:
+            return self._cache[1:]
+        size, ids_size = (st.st_size if st else 0 for st in stats)
+        # Tolère un ajout interrompu entre les deux fichiers
+        n = min(ids_size // 8, size // (4 * self.dim))
+        if n:
+            ids = np.fromfile(self.ids_path, dtype=np.int64, count=n)
+            vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+        else:
+            ids = np.empty(0, dtype=np.int64)
+            vectors = np.empty((0, self.dim), dtype=np.float32)
+        self._cache = (signature, ids, vectors)
+        return ids, vectors
+
+    @staticmethod
+    def _row(ids, project_id):
+        rows = np.flatnonzero(ids == project_id)
+        return int(rows[0]) if len(rows) else None
+
+    def upsert(self, project_id, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._locked():
+            ids, _ = self._load(force=True)
+            row = self._row(ids, project_id)
+            if row is None:
+                # Écarte un éventuel ajout interrompu avant d'ajouter la ligne
+                for path, row_size in ((self.vectors_path, 4 * self.dim), (self.ids_path, 8)):
+                    if path.exists() and path.stat().st_size > len(ids) * row_size:
+                        os.truncate(path, len(ids) * row_size)
+                with open(self.vectors_path, "ab") as fh:
+                    fh.write(vector.tobytes())
+                with open(self.ids_path, "ab") as fh:
+                    fh.write(np.int64(project_id).tobytes())
+            else:
+                writable = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(len(ids), self.dim))
+                writable[row] = vector
+                writable.flush()
+
+    def remove(self, project_id):
+        # Ligne mise à zéro (similarité nulle) ; retirée au prochain rebuild
+        if self._row(self._load()[0], project_id) is not None:
+            self.upsert(project_id, np.zeros(self.dim, dtype=np.float32))
+
+    def rebuild(self, items):
+        """Réécrit l'index à partir d'un itérable de (id, vecteur)."""
+        with self._locked():
+            tmp_ids = self.ids_path.with_suffix(".tmp")
+            tmp_vectors = self.vectors_path.with_suffix(".tmp")
+            with open(tmp_ids, "wb") as fids, open(tmp_vectors, "wb") as fvec:
+                for project_id, vector in items:
+                    fids.write(np.int64(project_id).tobytes())
+                    fvec.write(np.asarray(vector, dtype=np.float32).tobytes())
+            os.replace(tmp_vectors, self.vectors_path)
+            os.replace(tmp_ids, self.ids_path)
+            self._cache = None
+
+    def query(self, vector, k=6, exclude=None):
+        """Retourne les k couples (id, score cosinus) les plus proches, score > 0."""
+        ids, vectors = self._load()
+        if not len(ids):
+            return []
+        scores = vectors @ np.asarray(vector, dtype=np.float32)
+        if exclude is not None:
+            scores[ids == exclude] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+@lru_cache(maxsize=1)
+def get_index():
+    return SimilarityIndex(settings.SIMILARITY_INDEX_DIR)
+
+
+def index_project(project):
+    if project.is_public:
+        get_index().upsert(project.id, vectorize(project))
+    else:
+        get_index().remove(project.id)
+
+
+def related_projects(project, k=6):
+    """Projets publics les plus proches de `project`, du plus au moins similaire."""
+    from .models import GameProject
+    try:
+        hits = get_index().query(vectorize(project), k, exclude=project.id)
+    except (OSError, ValueError) as e:
+        logger.error(f"Index de similarité illisible: {e}")
+        return []
+    found = GameProject.objects.filter(is_public=True).in_bulk([pid for pid, _ in hits])
+    return [found[pid] for pid, _ in hits if pid in found]
@@ -0,0 +1,102 @@
+"""
+Coalescence des générations concurrentes (single-flight).
+
+Un seul worker génère pour un couple (projet, hash des entrées) : le verrou
+est pris par un UPDATE conditionnel sur la ligne du projet, donc atomique
+entre processus quel que soit le backend de base de données. Chaque détenteur
+reçoit un jeton unique ; seul ce jeton peut rafraîchir ou libérer le verrou.
+
+Les requêtes identiques arrivées pendant la génération attendent sa fin. Si
+elle a réussi, elles partagent le résultat enregistré sur le projet ; sinon
+(quota, erreur) elles retentent d'acquérir le verrou et génèrent elles-mêmes.
+"""
+import time, uuid, hashlib, datetime
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import GameProject
+
+# Un verrou non rafraîchi depuis LOCK_TTL est considéré abandonné. Le détenteur
+# le rafraîchit entre chaque étape ; la plus longue (texte : 4 modèles x 3
+# tentatives de 120 s + attentes) reste sous l'heure.
+LOCK_TTL = datetime.timedelta(hours=1)
+# Attente maximale d'une requête identique, sous le délai du proxy / du client :
+# au-delà, elle répond 409 au lieu d'immobiliser un worker (LOCK_TTL ne sert
+# qu'à détecter les verrous abandonnés).
+WAIT_TIMEOUT = 25  # secondes
+POLL_INTERVAL = 0.5  # secondes
+MAX_ATTEMPTS = 3  # acquisitions tentées par une requête dont le leader a échoué
+
+ACQUIRED, SHARED, CONFLICT, TIMEOUT = "acquired", "shared", "conflict", "timeout"
+
+
+def input_key(project, draft=False, section=""):
+    raw = "|".join([
+        project.title, project.genre, project.ambiance or "", project.keywords or "",
+        project.references or "", "draft" if draft else "full", section,
+    ])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def try_acquire(project_id, key):
+    """Retourne le jeton du verrou si on l'obtient, sinon None."""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    acquired = GameProject.objects.filter(pk=project_id).filter(
+        Q(generation_token="") | Q(generation_started_at__lt=now - LOCK_TTL)
+    ).update(generation_key=key, generation_token=token, generation_started_at=now)
+    return token if acquired else None
+
+
+def holder(project_id):
+    """(hash des entrées, jeton) de la génération en cours, ou None."""
+    row = GameProject.objects.filter(pk=project_id).values_list("generation_key", "generation_token").first()
+    return row if row and row[1] else None
+
+
+def heartbeat(project_id, token):
+    GameProject.objects.filter(pk=project_id, generation_token=token).update(generation_started_at=timezone.now())
+
+
+def release(project_id, token, succeeded=False):
+    fields = {"generation_key": "", "generation_token": "", "generation_started_at": None}
+    if succeeded:
+        fields["generation_done_token"] = token
+    GameProject.objects.filter(pk=project_id, generation_token=token).update(**fields)
+
+
+def wait_for(project_id, token, timeout=WAIT_TIMEOUT):
+    """Attend la libération du verrou `token`. Retourne True si cette génération
+    a réussi, False si elle a échoué, None si le délai expire."""
+    deadline = time.monotonic() + timeout
+    while True:
+        current, done = GameProject.objects.filter(pk=project_id).values_list(
+            "generation_token", "generation_done_token").first() or ("", "")
+        if current != token:
+            return done == token
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(POLL_INTERVAL)
+
+
+def acquire_or_wait(project_id, key, timeout=WAIT_TIMEOUT):
+    """
+    Retourne (ACQUIRED, jeton) si l'appelant doit générer, sinon (SHARED |
+    CONFLICT | TIMEOUT, None). Une requête identique à une génération en cours
+    attend son issue ; si celle-ci échoue, elle retente l'acquisition.
+    """
+    for _ in range(MAX_ATTEMPTS):
+        token = try_acquire(project_id, key)
+        if token:
+            return ACQUIRED, token
+        current = holder(project_id)
+        if current is None:  # libéré entre-temps
+            continue
+        if current[0] != key:
+            return CONFLICT, None
+        succeeded = wait_for(project_id, current[1], timeout)
+        if succeeded is None:
+            return TIMEOUT, None
+        if succeeded:
+            return SHARED, None
+    return CONFLICT, None
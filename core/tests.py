@@ -1,3 +1,315 @@
-from django.test import TestCase
+import io, json, datetime, tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+import numpy as np
+
+from . import singleflight, similarity
+from .models import GameProject, ApiUsage, ApiUsageMonthly
+
+User = get_user_model()
+
+
+class SingleFlightTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username="alice")
+        self.project = GameProject.objects.create(author=self.user, title="Neon", genre="RPG", ambiance="cyberpunk")
+        self.key = singleflight.input_key(self.project)
+
+    def test_acquire_is_exclusive(self):
+        token = singleflight.try_acquire(self.project.id, self.key)
+        self.assertTrue(token)
+        self.assertIsNone(singleflight.try_acquire(self.project.id, self.key))
+        self.assertEqual(singleflight.holder(self.project.id), (self.key, token))
+
+    def test_release_requires_own_token(self):
+        token = singleflight.try_acquire(self.project.id, self.key)
+        singleflight.release(self.project.id, "someone-else")
+        self.assertEqual(singleflight.holder(self.project.id), (self.key, token))
+        singleflight.release(self.project.id, token)
+        self.assertIsNone(singleflight.holder(self.project.id))
+
+    def test_stale_lock_is_taken_over_and_old_holder_cannot_release_it(self):
+        old = singleflight.try_acquire(self.project.id, self.key)
+        GameProject.objects.filter(pk=self.project.id).update(
+            generation_started_at=timezone.now() - singleflight.LOCK_TTL - datetime.timedelta(seconds=1))
+        new = singleflight.try_acquire(self.project.id, self.key)
+        self.assertTrue(new)
+        singleflight.release(self.project.id, old, succeeded=True)
+        self.assertEqual(singleflight.holder(self.project.id), (self.key, new))
+
+    def test_heartbeat_keeps_lock_alive(self):
+        token = singleflight.try_acquire(self.project.id, self.key)
+        GameProject.objects.filter(pk=self.project.id).update(
+            generation_started_at=timezone.now() - singleflight.LOCK_TTL - datetime.timedelta(seconds=1))
+        singleflight.heartbeat(self.project.id, token)
+        self.assertIsNone(singleflight.try_acquire(self.project.id, self.key))
+
+    def test_wait_for_reports_leader_outcome(self):
+        token = singleflight.try_acquire(self.project.id, self.key)
+        self.assertIsNone(singleflight.wait_for(self.project.id, token, timeout=0))
+        singleflight.release(self.project.id, token, succeeded=True)
+        self.assertTrue(singleflight.wait_for(self.project.id, token, timeout=0))
+
+        token = singleflight.try_acquire(self.project.id, self.key)
+        singleflight.release(self.project.id, token, succeeded=False)
+        self.assertFalse(singleflight.wait_for(self.project.id, token, timeout=0))
+
+    def test_different_inputs_conflict(self):
+        singleflight.try_acquire(self.project.id, "other-inputs")
+        self.assertEqual(singleflight.acquire_or_wait(self.project.id, self.key, timeout=0), (singleflight.CONFLICT, None))
+
+    def test_identical_request_shares_successful_result(self):
+        leader = singleflight.try_acquire(self.project.id, self.key)
+        real_wait = singleflight.wait_for
+
+        def leader_succeeds(project_id, token, timeout):
+            singleflight.release(project_id, leader, succeeded=True)
+            return real_wait(project_id, token, timeout)
+
+        with mock.patch.object(singleflight, "wait_for", side_effect=leader_succeeds):
+            self.assertEqual(singleflight.acquire_or_wait(self.project.id, self.key), (singleflight.SHARED, None))
+
+    def test_identical_request_retries_when_leader_fails(self):
+        # Ex. : le leader a atteint le quota (429) ou a levé une exception
+        leader = singleflight.try_acquire(self.project.id, self.key)
+        real_wait = singleflight.wait_for
+
+        def leader_fails(project_id, token, timeout):
+            singleflight.release(project_id, leader, succeeded=False)
+            return real_wait(project_id, token, timeout)
+
+        with mock.patch.object(singleflight, "wait_for", side_effect=leader_fails):
+            status, token = singleflight.acquire_or_wait(self.project.id, self.key)
+        self.assertEqual(status, singleflight.ACQUIRED)
+        self.assertNotEqual(token, leader)
+
+    def test_waiters_give_up_well_before_the_lock_ttl(self):
+        singleflight.try_acquire(self.project.id, self.key)
+        clock = [0.0]
+        with mock.patch.object(singleflight.time, "monotonic", side_effect=lambda: clock[0]), \
+                mock.patch.object(singleflight.time, "sleep", side_effect=lambda s: clock.__setitem__(0, clock[0] + s)):
+            self.assertEqual(singleflight.acquire_or_wait(self.project.id, self.key), (singleflight.TIMEOUT, None))
+        self.assertLessEqual(clock[0], singleflight.WAIT_TIMEOUT + singleflight.POLL_INTERVAL)
+        self.assertLess(singleflight.WAIT_TIMEOUT, singleflight.LOCK_TTL.total_seconds() / 10)
+
+    def test_identical_request_times_out_while_leader_runs(self):
+        singleflight.try_acquire(self.project.id, self.key)
+        self.assertEqual(singleflight.acquire_or_wait(self.project.id, self.key, timeout=0), (singleflight.TIMEOUT, None))
+
+
+class RegenerateSectionViewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username="bob")
+        self.project = GameProject.objects.create(author=self.user, title="Neon", genre="RPG", ambiance="cyberpunk")
+        self.client.force_login(self.user)
+
+    def test_non_string_section_is_rejected(self):
+        for section in (["universe"], {"a": 1}, 3, None):
+            resp = self.client.post(reverse("core:generate_section"), json.dumps({"project_id": self.project.id, "section": section}),
+                                    content_type="application/json")
+            self.assertEqual(resp.status_code, 400)
+
+
+class RollupApiUsageTests(TestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create(username="alice")
+        self.bob = User.objects.create(username="bob")
+        self.today = datetime.datetime.utcnow().date()
+
+    def _usage(self, user, day, count):
+        ApiUsage.objects.create(user=user, day=day, count=count)
+
+    def test_old_days_are_rolled_up_by_month_in_batches(self):
+        for day in (3, 10, 17):
+            self._usage(self.alice, datetime.date(2024, 1, day), 2)
+        self._usage(self.alice, datetime.date(2024, 2, 1), 5)
+        self._usage(self.bob, datetime.date(2024, 1, 9), 4)
+        self._usage(self.alice, self.today, 7)
+        ApiUsageMonthly.objects.create(user=self.alice, month=datetime.date(2024, 1, 1), count=1)
+
+        out = io.StringIO()
+        call_command("rollup_api_usage", "--keep-days=30", "--batch-size=2", stdout=out)
+
+        self.assertIn("5 ligne(s)", out.getvalue())
+        monthly = {(m.user.username, m.month): m.count for m in ApiUsageMonthly.objects.select_related("user")}
+        self.assertEqual(monthly, {
+            ("alice", datetime.date(2024, 1, 1)): 7,
+            ("alice", datetime.date(2024, 2, 1)): 5,
+            ("bob", datetime.date(2024, 1, 1)): 4,
+        })
+        self.assertEqual(list(ApiUsage.objects.values_list("day", "count")), [(self.today, 7)])
+
+
+class ApiUsageDayMigrationTests(TransactionTestCase):
+    before = [("core", "0003_gameproject_generation_lock")]
+    after = [("core", "0004_apiusage_day_apiusagemonthly")]
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self._migrate(executor.loader.graph.leaf_nodes())
+
+    def test_day_key_is_converted_forward_and_back(self):
+        apps = self._migrate(self.before)
+        user = apps.get_model("auth", "User").objects.create(username="alice")
+        apps.get_model("core", "ApiUsage").objects.create(user_id=user.id, day_key="20240229", count=3)
+
+        apps = self._migrate(self.after)
+        usage = apps.get_model("core", "ApiUsage").objects.get()
+        self.assertEqual((usage.day, usage.count), (datetime.date(2024, 2, 29), 3))
+
+        apps = self._migrate(self.before)
+        usage = apps.get_model("core", "ApiUsage").objects.get()
+        self.assertEqual((usage.day_key, usage.count), ("20240229", 3))
+
+
+class DraftImageStorageTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.media.name, GENERATION_MODE="local")
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create(username="carol")
+        self.project = GameProject.objects.create(author=self.user, title="Neon", genre="RPG", ambiance="cyberpunk")
+        self.client.force_login(self.user)
+
+    def _generate(self, draft):
+        resp = self.client.post(reverse("core:generate"), json.dumps({"project_id": self.project.id, "draft": draft}),
+                                content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+
+    def _characters(self):
+        return sorted(p.name for p in (Path(self.media.name) / "generated" / "characters").iterdir())
+
+    def test_drafts_overwrite_one_file_and_full_generation_removes_it(self):
+        draft_name = f"{self.project.slug}-char-draft.png"
+        self._generate(draft=True)
+        self._generate(draft=True)
+        self.assertEqual(self._characters(), [draft_name])
+
+        self._generate(draft=False)
+        self.project.refresh_from_db()
+        self.assertEqual(self._characters(), [Path(self.project.image_character.name).name])
+        self.assertNotIn("-draft", self.project.image_character.name)
+
+
+def _unit(i, dim=similarity.DIM):
+    vec = np.zeros(dim, dtype=np.float32)
+    vec[i] = 1.0
+    return vec
+
+
+class SimilarityIndexTests(TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.index = similarity.SimilarityIndex(self.dir)
+
+    def test_vectorize_is_normalized_and_favours_shared_terms(self):
+        make = lambda **kw: GameProject(**{"title": "", "genre": "", "ambiance": "", "keywords": "", **kw})
+        neon = similarity.vectorize(make(genre="RPG", ambiance="cyberpunk", keywords="hackers, néons"))
+        close = similarity.vectorize(make(genre="RPG", ambiance="cyberpunk", keywords="hackers"))
+        far = similarity.vectorize(make(genre="Tactique", ambiance="médiéval", keywords="chevaliers"))
+        self.assertAlmostEqual(float(np.linalg.norm(neon)), 1.0, places=5)
+        self.assertGreater(float(neon @ close), float(neon @ far))
+        self.assertFalse(similarity.vectorize(make(generated={"raw_text": "cyberpunk hackers"})).any())
+
+    def test_upsert_appends_then_updates_in_place(self):
+        self.index.upsert(1, _unit(0))
+        self.index.upsert(2, _unit(1))
+        size = self.index.vectors_path.stat().st_size
+        self.assertEqual(self.index.query(_unit(0)), [(1, 1.0)])
+
+        self.index.upsert(1, _unit(1))
+        self.assertEqual(self.index.vectors_path.stat().st_size, size)
+        self.assertEqual(sorted(pid for pid, _ in self.index.query(_unit(1))), [1, 2])
+        self.assertEqual(self.index.query(_unit(1), exclude=2), [(1, 1.0)])
+
+    def test_remove_then_rebuild_compacts(self):
+        for pid in (1, 2, 3):
+            self.index.upsert(pid, _unit(pid))
+        self.index.remove(2)
+        self.assertEqual(self.index.query(_unit(2)), [])
+        self.assertEqual(self.index._load()[0].tolist(), [1, 2, 3])
+
+        self.index.rebuild([(1, _unit(1)), (3, _unit(3))])
+        self.assertEqual(self.index._load()[0].tolist(), [1, 3])
+        self.assertEqual(self.index.vectors_path.stat().st_size, 2 * 4 * similarity.DIM)
+        self.assertEqual(self.index.query(_unit(3)), [(3, 1.0)])
+
+    def test_reader_sees_writes_from_another_instance(self):
+        reader = similarity.SimilarityIndex(self.dir)
+        self.index.upsert(1, _unit(1))
+        self.assertEqual(reader.query(_unit(1)), [(1, 1.0)])
+        # Lecture entre l'écriture des vecteurs et celle des identifiants
+        with open(self.index.vectors_path, "ab") as fh:
+            fh.write(_unit(2).tobytes())
+        self.assertEqual(reader.query(_unit(2)), [])
+        with open(self.index.ids_path, "ab") as fh:
+            fh.write(np.int64(2).tobytes())
+        self.assertEqual(reader.query(_unit(2)), [(2, 1.0)])
+
+
+class RelatedProjectsTests(TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(SIMILARITY_INDEX_DIR=Path(tmp.name))
+        override.enable()
+        self.addCleanup(override.disable)
+        # get_index() est mis en cache : sans cache_clear, l'index réel serait utilisé
+        similarity.get_index.cache_clear()
+        self.addCleanup(similarity.get_index.cache_clear)
+        self.user = User.objects.create(username="dave")
+
+    def _project(self, title, is_public=True, **fields):
+        fields = {"genre": "RPG", "ambiance": "cyberpunk", "keywords": "hackers, néons", **fields}
+        return GameProject.objects.create(author=self.user, title=title, is_public=is_public, **fields)
+
+    def test_only_public_projects_are_suggested(self):
+        neon = self._project("Neon")
+        twin = self._project("Neon II")
+        hidden = self._project("Neon privé", is_public=False)
+        other = self._project("Donjon", genre="Tactique", ambiance="médiéval", keywords="chevaliers")
+        related = similarity.related_projects(neon)
+        self.assertEqual(related[0], twin)
+        self.assertNotIn(neon, related)
+        self.assertNotIn(hidden, related)
+
+        twin.is_public = False
+        twin.save()
+        self.assertNotIn(twin, similarity.related_projects(neon))
+        other_id, other_vector = other.id, similarity.vectorize(other)
+        self.assertIn(other_id, [pid for pid, _ in similarity.get_index().query(other_vector)])
+        other.delete()
+        self.assertNotIn(other_id, [pid for pid, _ in similarity.get_index().query(other_vector)])
+
+    def test_rebuild_command_indexes_public_projects(self):
+        neon = self._project("Neon")
+        self._project("Neon privé", is_public=False)
+        twin = self._project("Neon II")
+        out = io.StringIO()
+        call_command("rebuild_similarity_index", stdout=out)
+        self.assertIn("2 projet(s)", out.getvalue())
+        self.assertEqual(similarity.get_index()._load()[0].tolist(), [neon.id, twin.id])
@@ -15,5 +15,6 @@ urlpatterns = [
 
     # IA
     path("generate/", views.generate_game_view, name="generate"),           # POST JSON {project_id}
+    path("generate/section/", views.regenerate_section_view, name="generate_section"),  # POST JSON {project_id, section}
     path("explore/", views.explore_free_view, name="explore_free"),         # GET -> crée & génère aléatoire
 ]
\ No newline at end of file
@@ -1,18 +1,24 @@
-import json, io, datetime
+import json, datetime
 from django.conf import settings
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.generic import ListView, DetailView, CreateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponse
-from django.core.files.base import ContentFile
-from django.db.models import Q
+from django.core.files import File
+from django.db.models import F, Q
 from django.template.loader import render_to_string
 from weasyprint import HTML
 
 from .models import GameProject, Favorite, ApiUsage
 from .forms import ProjectCreateForm
-from ai.generator import generate_structured_game, generate_concept_image, random_seed_game
+from . import singleflight
+from .similarity import related_projects
+from ai import traffic
+from ai.generator import (
+    generate_structured_game, generate_concept_image_file, random_seed_game,
+    regenerate_section, get_section, merge_section, SECTIONS,
+)
 
 class HomeView(ListView):
     model = GameProject
@@ -40,6 +46,10 @@ class ProjectDetailView(DetailView):
     model = GameProject
     template_name = "core/project_detail.html"
     slug_field = "slug"
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["similar_projects"] = related_projects(self.object)
+        return context
 
 class CreateProjectView(LoginRequiredMixin, CreateView):
     model = GameProject
@@ -51,19 +61,17 @@ class CreateProjectView(LoginRequiredMixin, CreateView):
         obj.save()
         return redirect(obj.get_absolute_url())
 
-def _day_key():
-    now = datetime.datetime.utcnow()
-    return now.strftime("%Y%m%d")
+def _today():
+    return datetime.datetime.utcnow().date()
 
 def _check_quota(user):
     if not user.is_authenticated:
         return False, "Authentification requise."
-    day = _day_key()
-    usage, _ = ApiUsage.objects.get_or_create(user=user, day_key=day)
-    if usage.count >= settings.DAILY_GENERATION_LIMIT:
+    usage, _ = ApiUsage.objects.get_or_create(user=user, day=_today())
+    # Incrément conditionnel atomique : pas de dépassement entre requêtes concurrentes
+    updated = ApiUsage.objects.filter(pk=usage.pk, count__lt=settings.DAILY_GENERATION_LIMIT).update(count=F("count") + 1)
+    if not updated:
         return False, f"Limite quotidienne atteinte ({settings.DAILY_GENERATION_LIMIT}). Réessaie demain."
-    usage.count += 1
-    usage.save()
     return True, ""
 
 @login_required
@@ -79,14 +87,104 @@ def generate_game_view(request):
     if not project_id:
         return JsonResponse({"error": "project_id manquant"}, status=400)
 
-    ok, msg = _check_quota(request.user)
-    if not ok:
-        return JsonResponse({"error": msg}, status=429)
+    project = get_object_or_404(GameProject, id=project_id, author=request.user)
+
+    # Brouillon : génération locale instantanée, sans appel API ni quota
+    draft = bool(data.get("draft"))
+    return _single_flight_generation(request, project, draft, _run_generation)
+
+@login_required
+def regenerate_section_view(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "POST requis"}, status=400)
+    try:
+        data = json.loads(request.body.decode())
+    except Exception:
+        return JsonResponse({"error": "Payload JSON invalide"}, status=400)
+
+    project_id = data.get("project_id")
+    section = data.get("section")
+    if not project_id:
+        return JsonResponse({"error": "project_id manquant"}, status=400)
+    if not isinstance(section, str) or section not in SECTIONS:
+        return JsonResponse({"error": f"section invalide (attendu : {', '.join(SECTIONS)})"}, status=400)
 
     project = get_object_or_404(GameProject, id=project_id, author=request.user)
+    draft = bool(data.get("draft"))
+    return _single_flight_generation(request, project, draft, lambda p, d, beat: _run_section(p, d, section), section=section)
+
+def _single_flight_generation(request, project, draft, run, section=""):
+    inputs = {
+        "title": project.title, "genre": project.genre, "ambiance": project.ambiance or "",
+        "keywords": project.keywords or "", "references": project.references or "",
+    }
+    fields = {"section": section} if section else {}
+    with traffic.trace(project_id=project.id, draft=draft, inputs=inputs, **fields) as event:
+        # Single-flight : une seule génération par (projet, entrées) à la fois.
+        # Une requête identique déjà en vol est attendue ; son résultat n'est
+        # partagé que si elle a réussi, sinon on retente l'acquisition.
+        key = singleflight.input_key(project, draft, section)
+        status, token = singleflight.acquire_or_wait(project.id, key)
+        if status == singleflight.CONFLICT:
+            event["outcome"] = "conflict"
+            return JsonResponse({"error": "Une autre génération est déjà en cours pour ce projet."}, status=409)
+        if status == singleflight.TIMEOUT:
+            event["outcome"] = "timeout"
+            return JsonResponse({"error": "Génération toujours en cours, réessaie plus tard."}, status=409)
+        if status == singleflight.SHARED:
+            event["outcome"] = "shared"
+            project.refresh_from_db()
+            return JsonResponse({**_generation_payload(project, section), "shared": True})
+
+        succeeded = False
+        try:
+            if not draft:
+                ok, msg = _check_quota(request.user)
+                if not ok:
+                    event["outcome"] = "quota"
+                    return JsonResponse({"error": msg}, status=429)
+            project.refresh_from_db()
+            run(project, draft, lambda: singleflight.heartbeat(project.id, token))
+            succeeded = True
+        finally:
+            singleflight.release(project.id, token, succeeded)
+    return JsonResponse(_generation_payload(project, section))
+
+def _generation_payload(project, section=""):
+    payload = {"status": "ok", "project_url": project.get_absolute_url()}
+    if section:
+        payload["section"] = section
+        payload["value"] = get_section(project.generated or {}, section)
+    return payload
+
+def _run_section(project, draft, section):
+    with traffic.stage("text"):
+        value = regenerate_section(project.title, project.genre, project.ambiance or "", project.keywords or "", project.references or "",
+                                   project.generated, section, draft=draft)
+    project.generated = merge_section(project.generated, section, value)
+    with traffic.stage("save"):
+        project.save(update_fields=["generated", "updated_at"])
+
+DRAFT_SUFFIX = "-draft"
+
+def _store_image(project, field, base_name, ext, fh, draft):
+    # Un brouillon écrase toujours le même fichier : les brouillons
+    # (gratuits, hors quota) ne peuvent pas remplir le disque.
+    if field.name and DRAFT_SUFFIX + "." in field.name:
+        field.storage.delete(field.name)
+    name = f"{base_name}{DRAFT_SUFFIX if draft else ''}.{ext}"
+    if draft:
+        field.storage.delete(field.field.generate_filename(project, name))
+    field.save(name, File(fh), save=False)
+
+# Champs de contenu écrits par une génération : les champs du verrou
+# single-flight ne sont modifiés que par core.singleflight.
+GENERATED_FIELDS = ["generated", "image_character", "image_environment", "updated_at"]
 
+def _run_generation(project, draft, heartbeat=lambda: None):
     # 1) Génération texte
-    raw = generate_structured_game(project.title, project.genre, project.ambiance or "", project.keywords or "", project.references or "")
+    with traffic.stage("text"):
+        raw = generate_structured_game(project.title, project.genre, project.ambiance or "", project.keywords or "", project.references or "", draft=draft)
     if isinstance(raw, dict):
         project.generated = raw
     else:
@@ -97,22 +195,26 @@ def generate_game_view(request):
             project.generated = {"raw_text": str(raw)}
 
     # 2) Génération images (ne bloque pas si erreur)
+    heartbeat()
     try:
-        char_img = generate_concept_image(f"Concept art character, {project.ambiance or 'stylized'}, game style, full body, clean background")
-        buf = io.BytesIO(); char_img.save(buf, format="PNG")
-        project.image_character.save(f"{project.slug}-char.png", ContentFile(buf.getvalue()), save=False)
+        with traffic.stage("image_character"):
+            char_file, ext = generate_concept_image_file(f"Concept art character, {project.ambiance or 'stylized'}, game style, full body, clean background", draft=draft)
+            with char_file:
+                _store_image(project, project.image_character, f"{project.slug}-char", ext, char_file, draft)
     except Exception as e:
         print("Image personnage KO:", e)
 
+    heartbeat()
     try:
-        env_img = generate_concept_image(f"Concept art environment, {project.ambiance or 'stylized'}, game scene, wide composition, highly detailed")
-        buf2 = io.BytesIO(); env_img.save(buf2, format="PNG")
-        project.image_environment.save(f"{project.slug}-env.png", ContentFile(buf2.getvalue()), save=False)
+        with traffic.stage("image_environment"):
+            env_file, ext = generate_concept_image_file(f"Concept art environment, {project.ambiance or 'stylized'}, game scene, wide composition, highly detailed", draft=draft)
+            with env_file:
+                _store_image(project, project.image_environment, f"{project.slug}-env", ext, env_file, draft)
     except Exception as e:
         print("Image environnement KO:", e)
 
-    project.save()
-    return JsonResponse({"status": "ok", "project_url": project.get_absolute_url()})
+    with traffic.stage("save"):
+        project.save(update_fields=GENERATED_FIELDS)
 
 @login_required
 def toggle_favorite(request, slug):
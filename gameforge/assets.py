@@ -0,0 +1,135 @@
+"""
+Service des fichiers statiques et médias quand DEBUG est désactivé.
+
+- /static/ : sert la variante .br/.gz précompressée si le client l'accepte,
+  avec `Vary: Accept-Encoding` et un cache longue durée pour les noms empreintés.
+- /media/ : sert les images générées avec Last-Modified et les requêtes Range.
+
+Les réponses complètes passent par FileResponse, donc par `wsgi.file_wrapper`
+(sendfile) quand le serveur le propose.
+"""
+import re, mimetypes
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{12}\.\w+$")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))  # par ordre de préférence
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+STATIC_CACHE = "public, max-age=3600"
+MEDIA_CACHE = "public, max-age=86400"
+CHUNK_SIZE = 64 * 1024
+
+
+def _resolve(root, path):
+    try:
+        fullpath = Path(safe_join(root, path))
+    except SuspiciousFileOperation:
+        raise Http404("Chemin invalide")
+    if not fullpath.is_file():
+        raise Http404("Fichier introuvable")
+    return fullpath
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+def _iter_range(fh, start, length):
+    with fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _parse_range(header, size):
+    """Retourne (début, fin) inclusifs, None si absent/ignoré, ou False si insatisfiable."""
+    match = RANGE_RE.match(header or "")
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:  # suffixe : les N derniers octets
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _file_response(request, path, content_name, cache_control, encoding=None, ranges=False):
+    stat = path.stat()
+    if not was_modified_since(request.META.get("HTTP_IF_MODIFIED_SINCE"), int(stat.st_mtime)):
+        response = HttpResponseNotModified()
+    else:
+        content_type = mimetypes.guess_type(content_name)[0] or "application/octet-stream"
+        byte_range = _parse_range(request.META.get("HTTP_RANGE"), stat.st_size) if ranges else None
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+        elif byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(_iter_range(path.open("rb"), start, length),
+                                             status=206, content_type=content_type)
+            response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            response["Content-Length"] = str(length)
+        else:
+            response = FileResponse(path.open("rb"), content_type=content_type)
+            # FileResponse déduit un Content-Disposition du nom de fichier (.br/.gz) : inutile ici
+            response.headers.pop("Content-Disposition", None)
+        if encoding:
+            response["Content-Encoding"] = encoding
+        if ranges:
+            response["Accept-Ranges"] = "bytes"
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Cache-Control"] = cache_control
+    return response
+
+
+def serve_static(request, path):
+    fullpath = _resolve(settings.STATIC_ROOT, path)
+    accepted = _accepted_encodings(request.headers.get("Accept-Encoding", ""))
+    chosen, encoding = fullpath, None
+    for name, suffix in ENCODINGS:
+        variant = fullpath.with_name(fullpath.name + suffix)
+        if name in accepted and variant.is_file():
+            chosen, encoding = variant, name
+            break
+    cache_control = IMMUTABLE_CACHE if HASHED_NAME_RE.search(path) else STATIC_CACHE
+    response = _file_response(request, chosen, fullpath.name, cache_control, encoding=encoding)
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+def serve_media(request, path):
+    fullpath = _resolve(settings.MEDIA_ROOT, path)
+    return _file_response(request, fullpath, fullpath.name, MEDIA_CACHE, ranges=True)
+
+
+def urlpatterns():
+    return [
+        re_path(r"^%s(?P<path>.*)$" % re.escape(settings.STATIC_URL.lstrip("/")), serve_static),
+        re_path(r"^%s(?P<path>.*)$" % re.escape(settings.MEDIA_URL.lstrip("/")), serve_media),
+    ]
@@ -83,19 +83,34 @@ USE_TZ = True
 STATIC_URL = "/static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
+# collectstatic : noms empreintés + variantes .gz/.br (voir gameforge/storage.py ; .br requiert Brotli).
+# En production (DJANGO_DEBUG=0), `python manage.py collectstatic` fait partie du déploiement.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "gameforge.storage.CompressedManifestStaticFilesStorage"},
+}
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Index "projets similaires" (fichiers memory-mappés, voir core/similarity.py)
+SIMILARITY_INDEX_DIR = Path(os.environ.get("SIMILARITY_INDEX_DIR", BASE_DIR / "var" / "similarity"))
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # ---- Variables Hugging Face (chargées depuis .env) ----
 HUGGINGFACE_API_TOKEN = os.environ.get("HUGGINGFACE_API_TOKEN", "")
 HF_TEXT_MODEL = os.environ.get("HF_TEXT_MODEL", "HuggingFaceH4/zephyr-7b-beta")
 HF_IMG_MODEL = os.environ.get("HF_IMG_MODEL", "stabilityai/stable-diffusion-2-1")
+# "remote" (API + secours local) ou "local" (mode dégradé, générateur procédural uniquement)
+GENERATION_MODE = os.environ.get("GENERATION_MODE", "remote")
+# Journal JSONL du trafic de génération (vide = désactivé), rejouable via `manage.py replay_traffic`
+GENERATION_TRAFFIC_LOG = os.environ.get("GENERATION_TRAFFIC_LOG", "")
 
 # Limite d'appels IA / utilisateur / 24h
 DAILY_GENERATION_LIMIT = int(os.environ.get("DAILY_GENERATION_LIMIT", "10"))
+# Jours de ApiUsage conservés avant agrégation mensuelle (`manage.py rollup_api_usage`)
+API_USAGE_RETENTION_DAYS = int(os.environ.get("API_USAGE_RETENTION_DAYS", "90"))
 
 # Auth redirections
 LOGIN_URL = "/accounts/login/"
@@ -0,0 +1,54 @@
+"""
+Stockage des fichiers statiques pour la production.
+
+`collectstatic` produit des noms empreintés (app.3f2a9c1b7d4e.css) via le
+manifeste de Django, puis écrit à côté de chaque fichier texte une variante
+précompressée .gz (et .br si le module `brotli` est installé).
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # dépendance optionnelle
+    brotli = None
+
+COMPRESS_EXTENSIONS = (".css", ".js", ".svg", ".html", ".txt", ".json", ".map")
+MIN_SIZE = 256  # en dessous, la compression ne vaut pas l'en-tête
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Sans manifeste (collectstatic non lancé, tests), {% static %} retombe sur
+    # le nom non empreinté au lieu de lever une erreur 500.
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        names = set(self.hashed_files) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESS_EXTENSIONS) and self.exists(name):
+                self._write_compressed(name)
+
+    def _write_compressed(self, name):
+        path = self.path(name)
+        with open(path, "rb") as fh:
+            raw = fh.read()
+        if len(raw) < MIN_SIZE:
+            return
+        variants = [(".gz", gzip.compress(raw, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(raw)))
+        for suffix, data in variants:
+            # On ne garde une variante que si elle est réellement plus petite
+            if len(data) < len(raw):
+                with open(path + suffix, "wb") as out:
+                    out.write(data)
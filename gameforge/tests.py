@@ -0,0 +1,156 @@
+import os, gzip, tempfile
+from pathlib import Path
+
+from django.core.files.storage import FileSystemStorage
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils.http import http_date
+
+from . import assets
+from .storage import CompressedManifestStaticFilesStorage, brotli
+
+
+class ParseRangeTests(SimpleTestCase):
+
+    def test_ranges(self):
+        cases = {
+            "bytes=0-99": (0, 99),
+            "bytes=10-": (10, 999),
+            "bytes=10-5000": (10, 999),
+            "bytes=-100": (900, 999),  # suffixe : les 100 derniers octets
+            "bytes=-5000": (0, 999),
+            "bytes=-0": False,
+            "bytes=1000-": False,
+            "bytes=5-2": False,
+            "bytes=0-1,5-6": None,  # multi-plages : ignorées, réponse complète
+            "bytes=-": None,
+            "items=0-1": None,
+            None: None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(assets._parse_range(header, 1000), expected)
+
+
+class AssetViewTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.static = self.root / "static"
+        self.media = self.root / "media"
+        (self.static / "css").mkdir(parents=True)
+        self.media.mkdir()
+        for name in ("app.css", "app.0123456789ab.css"):
+            (self.static / "css" / name).write_text("body { color: red; }\n" * 50)
+            (self.static / "css" / (name + ".gz")).write_bytes(b"gz")
+            (self.static / "css" / (name + ".br")).write_bytes(b"br")
+        self.image = bytes(range(256)) * 4
+        (self.media / "hero.png").write_bytes(self.image)
+        (self.root / "secret.txt").write_text("secret")
+        override = override_settings(STATIC_ROOT=self.static, MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.factory = RequestFactory()
+
+    def _static(self, path, **headers):
+        return assets.serve_static(self.factory.get("/static/" + path, headers=headers), path)
+
+    def _media(self, path, **headers):
+        return assets.serve_media(self.factory.get("/media/" + path, headers=headers), path)
+
+    def test_precompressed_variant_follows_accept_encoding(self):
+        cases = {
+            "gzip, br": ("br", b"br"),
+            "br;q=0, gzip": ("gzip", b"gz"),
+            "gzip;q=0.0, br; q=0": (None, None),
+            "identity": (None, None),
+            "": (None, None),
+        }
+        for accept, (encoding, body) in cases.items():
+            with self.subTest(accept=accept):
+                resp = self._static("css/app.css", accept_encoding=accept)
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(resp.get("Content-Encoding"), encoding)
+                self.assertIn("Accept-Encoding", resp["Vary"])
+                self.assertEqual(resp["Content-Type"], "text/css")
+                self.assertNotIn("Content-Disposition", resp)
+                content = b"".join(resp.streaming_content)
+                if body is not None:
+                    self.assertEqual(content, body)
+                else:
+                    self.assertTrue(content.startswith(b"body {"))
+
+    def test_cache_control_depends_on_hashed_name(self):
+        self.assertEqual(self._static("css/app.0123456789ab.css")["Cache-Control"], assets.IMMUTABLE_CACHE)
+        self.assertEqual(self._static("css/app.css")["Cache-Control"], assets.STATIC_CACHE)
+        self.assertEqual(self._media("hero.png")["Cache-Control"], assets.MEDIA_CACHE)
+
+    def test_not_modified(self):
+        mtime = (self.static / "css" / "app.css").stat().st_mtime
+        resp = self._static("css/app.css", if_modified_since=http_date(mtime + 1))
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp["Last-Modified"], http_date(mtime))
+
+    def test_media_ranges(self):
+        resp = self._media("hero.png", range="bytes=-100")
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp["Content-Range"], f"bytes {len(self.image) - 100}-{len(self.image) - 1}/{len(self.image)}")
+        self.assertEqual(b"".join(resp.streaming_content), self.image[-100:])
+
+        resp = self._media("hero.png", range="bytes=-0")
+        self.assertEqual(resp.status_code, 416)
+        self.assertEqual(resp["Content-Range"], f"bytes */{len(self.image)}")
+
+        resp = self._media("hero.png", range="bytes=0-1,5-6")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Accept-Ranges"], "bytes")
+        self.assertEqual(b"".join(resp.streaming_content), self.image)
+
+    def test_path_traversal_and_missing_files_are_404(self):
+        for path in ("../secret.txt", "/etc/passwd", "css/missing.css", "css"):
+            with self.subTest(path=path):
+                with self.assertRaises(Http404):
+                    self._static(path)
+        with self.assertRaises(Http404):
+            self._media("../secret.txt")
+
+
+class CompressedStorageTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.src = Path(tmp.name) / "src"
+        self.dest = Path(tmp.name) / "dest"
+        self.src.mkdir()
+        self.storage = CompressedManifestStaticFilesStorage(location=self.dest, base_url="/static/")
+
+    def _collect(self, files):
+        source = FileSystemStorage(location=self.src)
+        for name, data in files.items():
+            (self.src / name).write_bytes(data)
+            with source.open(name) as fh:
+                self.storage.save(name, fh)
+        list(self.storage.post_process({name: (source, name) for name in files}))
+        return {p.name for p in self.dest.iterdir()}
+
+    def test_gzip_variant_only_when_smaller(self):
+        files = self._collect({
+            "big.css": b"body { color: red; }\n" * 50,
+            "noise.txt": os.urandom(600),  # incompressible
+            "tiny.css": b"a{}",  # sous MIN_SIZE
+        })
+        hashed = self.storage.stored_name("big.css")
+        self.assertNotEqual(hashed, "big.css")
+        self.assertIn(hashed + ".gz", files)
+        self.assertEqual(gzip.decompress((self.dest / (hashed + ".gz")).read_bytes()),
+                         (self.dest / hashed).read_bytes())
+        self.assertFalse([f for f in files if f.startswith("noise") and f.endswith(".gz")])
+        self.assertFalse([f for f in files if f.startswith("tiny") and f.endswith(".gz")])
+        if brotli is not None:
+            self.assertIn(hashed + ".br", files)
+
+    def test_missing_manifest_entry_falls_back_to_plain_name(self):
+        self.assertEqual(self.storage.stored_name("css/absent.css"), "css/absent.css")